@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_rename_is_superadmin_account_is_superuser_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='wishlist_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
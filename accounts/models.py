@@ -54,6 +54,10 @@ class Account(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
 
+    # Badge counts kept by the cart and wishlist views (see carts.counters)
+    cart_count = models.PositiveIntegerField(default=0, editable=False)
+    wishlist_count = models.PositiveIntegerField(default=0, editable=False)
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name', 'phone_number']
 
@@ -13,8 +13,8 @@ from django.utils.html import strip_tags
 from django.contrib.auth.tokens import default_token_generator
 from django.core.mail import EmailMessage
 
-from carts.views import _cart_id
-from carts.models import Cart, CartItem
+from carts.merge import merge_guest_cart
+from core.shopper import shopper_changed
 
 import requests
 
@@ -95,17 +95,11 @@ def login(request):
 
         user = auth.authenticate(email=email, password=password)
         if user is not None:
-            try:
-                cart = Cart.objects.get(cart_id=_cart_id(request))
-                cart_items = CartItem.objects.filter(cart=cart)
-
-                for item in cart_items:
-                    item.user = user
-                    item.save()
-            except Cart.DoesNotExist:
-                pass
+            # Before auth.login() cycles the session key the guest cart is filed under
+            merge_guest_cart(request.session.session_key, user)
 
             auth.login(request, user)
+            shopper_changed(request)
             messages.success(request, 'You are now logged in!')
 
             url = request.META.get('HTTP_REFERER')
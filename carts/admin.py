@@ -16,6 +16,9 @@ class CartItemAdmin(admin.ModelAdmin):
 
     readonly_fields = ("content_object",)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_objects()
+
     def item_name(self, obj):
         """
         Display the name of the related object (pet, product, etc.)
@@ -0,0 +1,93 @@
+# carts/counters.py
+
+"""
+Denormalized badge counts: Account.cart_count and Account.wishlist_count
+for signed-in shoppers, Cart.item_count for guest carts. The views change
+them with F() in the same transaction as the rows they count, so reading
+a badge is a primary key lookup; `manage.py reap_carts` recounts the
+owners of the lines it deletes, and `manage.py reconcile_counters`
+repairs drift from admin edits or raw SQL.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, PositiveIntegerField, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Now
+
+from wishlist.models import WishlistItem
+from .models import Cart, CartItem
+
+
+def _bumped(field, delta):
+    return Greatest(F(field) + delta, Value(0), output_field=PositiveIntegerField())
+
+
+def adjust_cart_count(delta, user_id=None, cart_id=None):
+    """Add delta to the cart count of a line's owner: user_id, else the guest cart cart_id."""
+    if not delta:
+        return
+    if user_id is not None:
+        get_user_model().objects.filter(pk=user_id).update(cart_count=_bumped('cart_count', delta))
+    elif cart_id is not None:
+        Cart.objects.filter(pk=cart_id, user=None).update(
+            item_count=_bumped('item_count', delta), last_active=Now()
+        )
+
+
+def adjust_wishlist_count(user_id, delta):
+    get_user_model().objects.filter(pk=user_id).update(wishlist_count=_bumped('wishlist_count', delta))
+
+
+def _total(queryset, group_by, aggregate):
+    """Subquery of aggregate over queryset's rows for the outer row, 0 if none."""
+    return Coalesce(
+        Subquery(queryset.order_by().values(group_by).annotate(total=aggregate).values('total')),
+        Value(0),
+        output_field=PositiveIntegerField(),
+    )
+
+
+def user_cart_count():
+    return _total(CartItem.objects.filter(user=OuterRef('pk'), active=True), 'user', Sum('quantity'))
+
+
+def user_wishlist_count():
+    return _total(WishlistItem.objects.filter(user=OuterRef('pk')), 'user', Count('pk'))
+
+
+def guest_cart_count():
+    return _total(CartItem.objects.filter(cart=OuterRef('pk'), active=True), 'cart', Sum('quantity'))
+
+
+def recount_cart(user_id=None, session_key=None):
+    """Recount the cart count of user_id, else of the guest cart of session_key, in one UPDATE."""
+    if user_id is not None:
+        get_user_model().objects.filter(pk=user_id).update(cart_count=user_cart_count())
+    elif session_key:
+        Cart.objects.filter(cart_id=session_key, user=None).update(
+            item_count=guest_cart_count(), last_active=Now()
+        )
+
+
+def reconcile(queryset, expected, batch_size):
+    """
+    Set the counter fields in expected ({field: expression}) to their true
+    values on the rows of queryset where they drifted, walking the primary
+    key batch_size rows at a time. Return the number of rows fixed.
+    """
+    drifted = Q()
+    for field in expected:
+        drifted |= ~Q(**{field: F(f'expected_{field}')})
+    annotated = queryset.annotate(**{f'expected_{field}': value for field, value in expected.items()})
+
+    fixed = 0
+    last = 0
+    while True:
+        keys = list(queryset.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not keys:
+            return fixed
+        last = keys[-1]
+        with transaction.atomic():
+            stale = list(annotated.filter(drifted, pk__in=keys).values_list('pk', flat=True))
+            if stale:
+                fixed += queryset.filter(pk__in=stale).update(**expected)
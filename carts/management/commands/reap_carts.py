@@ -0,0 +1,101 @@
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from carts.counters import guest_cart_count, reconcile, user_cart_count
+from carts.models import Cart, CartItem
+from shop.cartables import CARTABLES
+
+# Session engines whose sessions live in the django_session table
+DB_SESSION_ENGINES = (
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+def delete_in_batches(queryset, batch_size, key='pk'):
+    """
+    Delete the rows of queryset batch_size at a time, walking key upwards
+    so each batch starts where the last one stopped, each in its own short
+    transaction. Return a Counter of rows deleted per model, cascades
+    included.
+    """
+    deleted = Counter()
+    last = None
+    while True:
+        batch = queryset if last is None else queryset.filter(**{f'{key}__gt': last})
+        keys = list(batch.order_by(key).values_list(key, flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        last = keys[-1]
+        with transaction.atomic():
+            deleted.update(queryset.model.objects.filter(**{f'{key}__in': keys}).delete()[1])
+
+
+def owners(items, field):
+    """Distinct non-null values of field (user_id or cart_id) over items."""
+    return items.exclude(**{field: None}).order_by().values_list(field, flat=True).distinct()
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired sessions, guest carts whose session is gone (or, "
+        "without database sessions, left unchanged for SESSION_COOKIE_AGE), and "
+        "cart items that are inactive, ownerless or point at deleted pets/"
+        "products, in small batches, then recount the cart badges of the "
+        "users and guest carts that lost lines. Safe to run while the site is up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Rows deleted per transaction (default 500).",
+        )
+
+    def handle(self, *args, batch_size, **options):
+        started = time.monotonic()
+        now = timezone.now()
+
+        reaped = Counter()
+        guest_carts = Cart.objects.filter(user=None)
+        if settings.SESSION_ENGINE in DB_SESSION_ENGINES:
+            reaped += delete_in_batches(Session.objects.filter(expire_date__lt=now), batch_size, key='session_key')
+            live_session = Session.objects.filter(session_key=OuterRef('cart_id'), expire_date__gte=now)
+            guest_carts = guest_carts.filter(~Exists(live_session))
+        else:
+            # Sessions cannot be looked up; take a guest cart nobody has
+            # changed for a whole session cookie age as abandoned
+            guest_carts = guest_carts.filter(last_active__lt=now - timedelta(seconds=settings.SESSION_COOKIE_AGE))
+        # Owners whose cart counts include active lines about to be deleted;
+        # a dead guest cart's own counter goes with it
+        users = set(owners(CartItem.objects.filter(cart__in=guest_carts, active=True), 'user_id'))
+        reaped += delete_in_batches(guest_carts, batch_size)
+
+        orphaned = Q(active=False) | Q(user=None, cart=None)
+        for cartable in CARTABLES.values():
+            orphaned |= Q(
+                ~Exists(cartable.model.objects.filter(pk=OuterRef('object_id'))),
+                content_type_id=cartable.content_type_id,
+            )
+        orphaned_items = CartItem.objects.filter(orphaned)
+        counted = orphaned_items.filter(active=True)
+        users.update(owners(counted, 'user_id'))
+        carts = set(owners(counted.filter(user=None), 'cart_id'))
+        reaped += delete_in_batches(orphaned_items, batch_size)
+
+        fixed = reconcile(get_user_model().objects.filter(pk__in=users), {'cart_count': user_cart_count()}, batch_size)
+        fixed += reconcile(Cart.objects.filter(pk__in=carts, user=None), {'item_count': guest_cart_count()}, batch_size)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Reaped {reaped[Session._meta.label]} sessions, {reaped[Cart._meta.label]} guest carts "
+            f"and {reaped[CartItem._meta.label]} cart items, and fixed {fixed} cart counters, in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,34 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from carts.counters import guest_cart_count, reconcile, user_cart_count, user_wishlist_count
+from carts.models import Cart
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the cart and wishlist counters of users and guest carts "
+        "from their items and fix the ones that drifted, e.g. after admin "
+        "edits, raw SQL or reap_carts removing lines of deleted items."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Rows checked per transaction (default 500).",
+        )
+
+    def handle(self, *args, batch_size, **options):
+        started = time.monotonic()
+        users = reconcile(
+            get_user_model().objects.all(),
+            {'cart_count': user_cart_count(), 'wishlist_count': user_wishlist_count()},
+            batch_size,
+        )
+        carts = reconcile(Cart.objects.filter(user=None), {'item_count': guest_cart_count()}, batch_size)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Fixed the counters of {users} users and {carts} guest carts in {elapsed:.2f}s"
+        ))
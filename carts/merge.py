@@ -0,0 +1,52 @@
+# carts/merge.py
+
+"""
+Merging a guest's session cart into a user's cart on login, with a fixed
+number of statements however many lines either cart holds.
+"""
+
+from django.db import transaction
+from django.db.models import Case, Exists, F, OuterRef, Q, Subquery, When
+
+from .counters import recount_cart
+from .models import Cart, CartItem
+
+
+def merge_guest_cart(cart_id, user):
+    """
+    Move the active lines of the guest cart cart_id to user. Items the
+    user already has are merged into their line (added to an active one,
+    replacing an inactive one), the rest change hands, and the guest cart
+    becomes the user's cart if they have none. Return the number of guest
+    lines merged or moved.
+    """
+    guest_cart = Cart.objects.filter(cart_id=cart_id, user=None).first() if cart_id else None
+    if guest_cart is None:
+        return 0
+    user_cart = Cart.objects.filter(user=user).first()
+
+    guest_items = CartItem.objects.filter(cart=guest_cart, active=True)
+    user_items = CartItem.objects.filter(user=user)
+    same_guest_item = guest_items.filter(content_type=OuterRef('content_type'), object_id=OuterRef('object_id'))
+    same_user_item = user_items.filter(content_type=OuterRef('content_type'), object_id=OuterRef('object_id'))
+    guest_quantity = Subquery(same_guest_item.values('quantity')[:1])
+
+    with transaction.atomic():
+        merged = user_items.filter(Exists(same_guest_item)).update(
+            quantity=Case(When(active=True, then=F('quantity') + guest_quantity), default=guest_quantity),
+            active=True,
+        )
+        # Drop what was merged above, and stale lines nobody will see again
+        CartItem.objects.filter(Q(active=False) | Exists(same_user_item), cart=guest_cart).delete()
+
+        target = user_cart or guest_cart
+        moved = CartItem.objects.filter(cart=guest_cart).update(user=user, cart=target)
+        user_items.exclude(cart=target).update(cart=target)
+        recount_cart(user_id=user.pk)
+
+        if user_cart is None:
+            Cart.objects.filter(pk=guest_cart.pk).update(user=user)
+        else:
+            guest_cart.delete()
+
+    return merged + moved
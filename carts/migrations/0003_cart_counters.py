@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:47
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, PositiveIntegerField, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def total(queryset, group_by, aggregate):
+    subquery = queryset.order_by().values(group_by).annotate(total=aggregate).values('total')
+    return Coalesce(Subquery(subquery), Value(0), output_field=PositiveIntegerField())
+
+
+def fill_counters(apps, schema_editor):
+    Account = apps.get_model('accounts', 'Account')
+    Cart = apps.get_model('carts', 'Cart')
+    CartItem = apps.get_model('carts', 'CartItem')
+    WishlistItem = apps.get_model('wishlist', 'WishlistItem')
+    Account.objects.update(
+        cart_count=total(CartItem.objects.filter(user=OuterRef('pk'), active=True), 'user', Sum('quantity')),
+        wishlist_count=total(WishlistItem.objects.filter(user=OuterRef('pk')), 'user', Count('pk')),
+    )
+    Cart.objects.filter(user=None).update(
+        item_count=total(CartItem.objects.filter(cart=OuterRef('pk'), active=True), 'cart', Sum('quantity')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_cart_counters'),
+        ('carts', '0002_alter_cartitem_unique_together_and_more'),
+        ('wishlist', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
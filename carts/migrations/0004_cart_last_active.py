@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carts', '0003_cart_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='last_active',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
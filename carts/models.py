@@ -1,7 +1,19 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import connection, models
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from shop.cartables import CARTABLES
+
+MONEY_FIELD = models.DecimalField(max_digits=12, decimal_places=2)
+CENTS = Decimal('0.01')
+# Most units of one pet or product a cart line holds
+MAX_LINE_QUANTITY = 99
 
 
 class Cart(models.Model):
@@ -10,15 +22,79 @@ class Cart(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True
     )
+    # Quantity of active items, kept for guest carts (see carts.counters)
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+    # Last change to a guest cart's lines, bumped with item_count; reap_carts
+    # goes by it when sessions cannot be looked up
+    last_active = models.DateTimeField(default=timezone.now, editable=False)
 
     def __str__(self):
         return self.cart_id
 
     def total_price(self):
-        return sum(item.subtotal() for item in self.items.filter(active=True))
+        return self.items.filter(active=True).totals()[1]
 
     def total_quantity(self):
-        return sum(item.quantity for item in self.items.filter(active=True))
+        return self.items.filter(active=True).totals()[0]
+
+
+class CartItemQuerySet(models.QuerySet):
+
+    def with_objects(self):
+        """
+        Load the pets/products the items point to with one query per
+        content type, instead of one per item, and attach them as
+        content_object.
+        """
+        return self.select_related('content_type').prefetch_related('content_object')
+
+    def with_prices(self):
+        """
+        Annotate unit_price, read from the item's pet/product in SQL, and
+        line_total (unit_price * quantity). Items whose object is gone
+        are priced at 0.
+        """
+        prices = [
+            When(
+                content_type_id=cartable.content_type_id,
+                then=Subquery(
+                    cartable.model.objects.filter(pk=OuterRef('object_id')).values(cartable.price_field)[:1]
+                ),
+            )
+            for cartable in CARTABLES.values()
+        ]
+        return self.annotate(
+            unit_price=Coalesce(Case(*prices, output_field=MONEY_FIELD), Value(Decimal('0')), output_field=MONEY_FIELD),
+            line_total=models.ExpressionWrapper(F('unit_price') * F('quantity'), output_field=MONEY_FIELD),
+        )
+
+    def totals(self):
+        """Return (quantity, total) of the items with one aggregate query."""
+        totals = self.with_prices().aggregate(quantity=Sum('quantity'), total=Sum('line_total'))
+        return totals['quantity'] or 0, (totals['total'] or Decimal('0')).quantize(CENTS)
+
+    def totals_with_line(self, item_id):
+        """Return (quantity, total, subtotal of item_id) with one aggregate query."""
+        totals = self.with_prices().aggregate(
+            quantity=Sum('quantity'),
+            total=Sum('line_total'),
+            line=Sum('line_total', filter=models.Q(pk=item_id)),
+        )
+        return (
+            totals['quantity'] or 0,
+            (totals['total'] or Decimal('0')).quantize(CENTS),
+            (totals['line'] or Decimal('0')).quantize(CENTS),
+        )
+
+    def summary(self):
+        """
+        Return (items, quantity, total). The items carry their line_total,
+        so lines, subtotals and totals all come from a single query.
+        """
+        items = list(self.with_prices())
+        quantity = sum(item.quantity for item in items)
+        total = sum((item.line_total for item in items), Decimal('0'))
+        return items, quantity, total.quantize(CENTS)
 
 
 class CartItem(models.Model):
@@ -36,6 +112,8 @@ class CartItem(models.Model):
     object_id = models.PositiveIntegerField(null=True,blank=True)
     content_object = GenericForeignKey("content_type", "object_id")
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -50,8 +128,88 @@ class CartItem(models.Model):
             ),
         ]
 
+    @classmethod
+    def _upsert_sql(cls, user):
+        """
+        ON CONFLICT clause shared by the cart upserts: an active line goes up
+        by the inserted quantity and an inactive one restarts from it.
+        Signed-in users' lines are unique per user (and moved into the
+        inserted cart), guests' lines per cart.
+        """
+        qn = connection.ops.quote_name
+        table = qn(cls._meta.db_table)
+        if user is not None:
+            conflict = f"({qn('user_id')}, {qn('content_type_id')}, {qn('object_id')}) WHERE {qn('user_id')} IS NOT NULL"
+            moved = f", {qn('cart_id')} = EXCLUDED.{qn('cart_id')}"
+        else:
+            conflict = f"({qn('cart_id')}, {qn('content_type_id')}, {qn('object_id')}) WHERE {qn('cart_id')} IS NOT NULL"
+            moved = ""
+        return (
+            f"ON CONFLICT {conflict} DO UPDATE SET "
+            f"{qn('quantity')} = CASE WHEN {table}.{qn('active')} "
+            f"THEN {table}.{qn('quantity')} + EXCLUDED.{qn('quantity')} ELSE EXCLUDED.{qn('quantity')} END, "
+            f"{qn('active')} = EXCLUDED.{qn('active')}{moved}"
+        )
+
+    @classmethod
+    def add_one(cls, cartable, object_id, cart, user=None):
+        """
+        Put one more of a pet/product in the cart with a single
+        INSERT ... SELECT ... ON CONFLICT DO UPDATE statement, which is
+        safe against concurrent adds: a new line starts at 1, an active
+        line goes up by 1 and an inactive one is reactivated at 1.
+        Return (item id, quantity), or None if the object does not exist.
+        """
+        qn = connection.ops.quote_name
+        model = cartable.model
+        sql = (
+            f"INSERT INTO {qn(cls._meta.db_table)} ({qn('user_id')}, {qn('cart_id')}, {qn('content_type_id')}, "
+            f"{qn('object_id')}, {qn('quantity')}, {qn('active')}) "
+            f"SELECT %s, %s, %s, {qn(model._meta.pk.column)}, 1, %s "
+            f"FROM {qn(model._meta.db_table)} WHERE {qn(model._meta.pk.column)} = %s "
+            f"{cls._upsert_sql(user)} "
+            f"RETURNING {qn('id')}, {qn('quantity')}"
+        )
+        params = [
+            user.pk if user is not None else None,
+            cart.pk,
+            cartable.content_type_id,
+            True,
+            object_id,
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()
+
+    @classmethod
+    def add_many(cls, lines, cart, user=None):
+        """
+        Add quantities to several lines with one multi-row upsert; lines
+        is a list of (content_type_id, object_id, quantity) for objects
+        known to exist. Same rules as add_one().
+        """
+        if not lines:
+            return
+        qn = connection.ops.quote_name
+        rows = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(lines))
+        sql = (
+            f"INSERT INTO {qn(cls._meta.db_table)} ({qn('user_id')}, {qn('cart_id')}, {qn('content_type_id')}, "
+            f"{qn('object_id')}, {qn('quantity')}, {qn('active')}) VALUES {rows} "
+            f"{cls._upsert_sql(user)}"
+        )
+        user_id = user.pk if user is not None else None
+        params = [
+            value
+            for content_type_id, object_id, quantity in lines
+            for value in (user_id, cart.pk, content_type_id, object_id, quantity, True)
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
     def subtotal(self):
-        return getattr(self.content_object, "price", 0) * self.quantity
+        if hasattr(self, "line_total"):  # annotated by with_prices()
+            return self.line_total
+        return getattr(self.content_object, "price", Decimal("0")) * self.quantity
 
     def __str__(self):
         try:
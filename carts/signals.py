@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+
+from shop.models import Pet, Product
+from .store import catalog_changed
+
+
+# --------------------------
+# Cached carts hold price snapshots; retire them when prices may change
+# --------------------------
+for priced_model in (Pet, Product):
+    post_save.connect(catalog_changed, sender=priced_model)
+    post_delete.connect(catalog_changed, sender=priced_model)
@@ -0,0 +1,47 @@
+# carts/store.py
+
+"""
+Read-through cache of the shopper's active cart: its lines with their
+pets/products and price snapshots, and the totals, as returned by
+CartItemQuerySet.summary().
+
+Changes are written to CartItem in the request as before; the cached cart
+is keyed by the shopper's version (see core.shopper), so shopper_changed()
+after a write retires it, and by a catalog version that any pet or product
+change bumps. Both versions live in the cache backend, so carts are only
+as fresh as that backend is shared: with the per-process default a write
+in one worker cannot retire the carts cached by another, which is why
+CART_CACHE_TIMEOUT defaults to 0 unless a shared cache is configured.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.shopper import shopper_cache_key
+from .utils import shopper_cart_items
+
+CATALOG_VERSION_KEY = 'cart-catalog-version'
+
+
+def catalog_changed(sender, **kwargs):
+    """Retire every cached cart; connected to pet and product changes."""
+    cache.set(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+
+def cart_summary(request):
+    """
+    (items, quantity, total) of the shopper's active cart, from the cache
+    when CART_CACHE_TIMEOUT is set and the cart has not changed since.
+    """
+    key = shopper_cache_key(request, 'cart') if settings.CART_CACHE_TIMEOUT else None
+    if key is None:
+        return shopper_cart_items(request).with_objects().summary()
+
+    key = f'{key}:{cache.get_or_set(CATALOG_VERSION_KEY, time.time_ns, None)}'
+    summary = cache.get(key)
+    if summary is None:
+        summary = shopper_cart_items(request).with_objects().summary()
+        cache.set(key, summary, settings.CART_CACHE_TIMEOUT)
+    return summary
@@ -1,3 +1,418 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.shopper import shopper_summary
+from core.testing import create_shopper, create_store
+from shop.models import Pet, PetCategory, Product, ProductCategory
+from .counters import adjust_cart_count, recount_cart
+from .merge import merge_guest_cart
+from .models import MAX_LINE_QUANTITY, Cart, CartItem
+
+
+class CartTestCase(TestCase):
+    """A signed-in shopper, their cart and a catalog of pets and products."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_shopper()
+        cls.cart = Cart.objects.create(cart_id='shopper-cart', user=cls.user)
+
+        store = create_store()
+        dogs = PetCategory.objects.create(name='Dogs')
+        food = ProductCategory.objects.create(name='Food', pet_category=dogs)
+        cls.pets = Pet.objects.bulk_create(
+            Pet(name=f'Pup {i}', category=dogs, age=1, price=100, image='pets/pup.jpg', store=store)
+            for i in range(25)
+        )
+        cls.products = Product.objects.bulk_create(
+            Product(name=f'Kibble {i}', category=food, price=10, image='products/kibble.jpg', store=store)
+            for i in range(25)
+        )
+
+    def setUp(self):
+        cache.clear()  # navbar counts cached by earlier tests
+
+    def fill_cart(self, size):
+        cache.clear()
+        CartItem.objects.all().delete()
+        objects = [obj for pair in zip(self.pets, self.products) for obj in pair][:size]
+        CartItem.objects.bulk_create(
+            CartItem(user=self.user, cart=self.cart, content_type=ContentType.objects.get_for_model(obj),
+                     object_id=obj.pk, quantity=2)
+            for obj in objects
+        )
+        recount_cart(user_id=self.user.pk)
+
+
+class CartPageQueryTests(CartTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('carts:view'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_cart_page_queries_do_not_grow_with_items(self):
+        self.fill_cart(2)
+        small = self.count_queries()
+        self.fill_cart(50)
+        self.assertEqual(self.count_queries(), small)
+
+
+class CartTotalsTests(CartTestCase):
+
+    def test_totals_are_computed_in_sql_as_decimals(self):
+        self.fill_cart(4)  # 2 pets at 100 and 2 products at 10, quantity 2 each
+        items = CartItem.objects.filter(cart=self.cart, active=True)
+
+        with self.assertNumQueries(1):
+            quantity, total = items.totals()
+        self.assertEqual((quantity, total), (8, Decimal('440.00')))
+
+        with self.assertNumQueries(1):
+            lines, quantity, total = items.summary()
+        self.assertEqual(sorted(line.line_total for line in lines), [Decimal('20.00')] * 2 + [Decimal('200.00')] * 2)
+        self.assertEqual((quantity, total), (8, Decimal('440.00')))
+        self.assertIsInstance(total, Decimal)
+
+
+class AddToCartTests(CartTestCase):
+
+    def add(self, obj, model='product'):
+        return self.client.post(reverse('carts:add_to_cart'), {'model': model, 'object_id': obj.pk}).json()
+
+    def test_adds_increment_one_line(self):
+        self.client.force_login(self.user)
+        product = self.products[0]
+        first = self.add(product)
+        second = self.add(product)
+
+        self.assertEqual(first['item_id'], second['item_id'])
+        self.assertEqual((second['quantity'], second['count']), (2, 2))
+        self.assertEqual(Decimal(second['subtotal']), Decimal('20.00'))
+        self.assertEqual(Decimal(second['total']), Decimal('20.00'))
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 1)
+
+    def test_inactive_line_is_reactivated_at_one(self):
+        self.client.force_login(self.user)
+        pet = self.pets[0]
+        CartItem.objects.create(user=self.user, cart=self.cart, content_type=ContentType.objects.get_for_model(Pet),
+                                object_id=pet.pk, quantity=5, active=False)
+        data = self.add(pet, model='pet')
+        self.assertEqual((data['quantity'], data['count']), (1, 1))
+
+    def test_guest_adds_use_the_session_cart(self):
+        product = self.products[0]
+        self.add(product)
+        data = self.add(product)
+        self.assertEqual(data['quantity'], 2)
+        line = CartItem.objects.get(pk=data['item_id'])
+        self.assertIsNone(line.user)
+        self.assertEqual(line.cart.cart_id, self.client.session.session_key)
+
+    def test_unknown_items_are_rejected(self):
+        response = self.client.post(reverse('carts:add_to_cart'), {'model': 'product', 'object_id': 999999})
+        self.assertFalse(response.json()['success'])
+        self.assertFalse(CartItem.objects.exists())
+
+
+class MergeGuestCartTests(CartTestCase):
+
+    def line(self, cart, obj, quantity, user=None, active=True):
+        return CartItem.objects.create(user=user, cart=cart, content_type=ContentType.objects.get_for_model(obj),
+                                       object_id=obj.pk, quantity=quantity, active=active)
+
+    def test_guest_lines_are_merged_into_the_users_cart(self):
+        pet, product, other = self.pets[0], self.products[0], self.products[1]
+        self.line(self.cart, pet, 1, user=self.user)
+        self.line(self.cart, product, 4, user=self.user, active=False)
+        guest = Cart.objects.create(cart_id='guest-session')
+        self.line(guest, pet, 2)
+        self.line(guest, product, 3)
+        self.line(guest, other, 1)
+        self.line(guest, self.pets[1], 1, active=False)
+
+        self.assertEqual(merge_guest_cart('guest-session', self.user), 3)
+
+        lines = {(line.object_id, line.content_type.model): (line.quantity, line.active, line.cart_id)
+                 for line in CartItem.objects.filter(user=self.user)}
+        self.assertEqual(lines, {
+            (pet.pk, 'pet'): (3, True, self.cart.pk),
+            (product.pk, 'product'): (3, True, self.cart.pk),
+            (other.pk, 'product'): (1, True, self.cart.pk),
+        })
+        self.assertFalse(Cart.objects.filter(pk=guest.pk).exists())
+        self.assertEqual(CartItem.objects.count(), 3)
+
+    def test_guest_cart_is_adopted_by_a_user_without_one(self):
+        self.cart.delete()
+        guest = Cart.objects.create(cart_id='guest-session')
+        self.line(guest, self.pets[0], 2)
+        merge_guest_cart('guest-session', self.user)
+        guest.refresh_from_db()
+        self.assertEqual(guest.user, self.user)
+        self.assertEqual(guest.items.get().user, self.user)
+
+    def test_statements_do_not_grow_with_cart_size(self):
+        def merge(size):
+            CartItem.objects.all().delete()
+            Cart.objects.filter(user=None).delete()
+            guest = Cart.objects.create(cart_id=f'guest-{size}')
+            for obj in self.pets[:size] + self.products[:size]:
+                self.line(guest, obj, 1)
+            with CaptureQueriesContext(connection) as queries:
+                merge_guest_cart(guest.cart_id, self.user)
+            return len(queries)
+
+        self.assertEqual(merge(1), merge(20))
+
+
+class GuestSessionTests(CartTestCase):
+
+    def test_browsing_creates_no_session_and_no_cart_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('carts:view'))
+            self.client.get(reverse('carts:cart_count_api'))
+        self.assertEqual(len(queries), 0)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+        self.assertFalse(Session.objects.exists())
+
+    def test_adding_to_the_cart_starts_the_session(self):
+        self.client.post(reverse('carts:add_to_cart'), {'model': 'pet', 'object_id': self.pets[0].pk})
+        self.assertIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+        response = self.client.get(reverse('carts:view'))
+        self.assertEqual(response.context['quantity'], 1)
+        self.assertEqual(response.context['shopper'].cart_count, 1)
+
+
+class ShopperSummaryTests(CartTestCase):
+
+    def test_counts_are_cached_until_the_cart_changes(self):
+        self.client.force_login(self.user)
+        self.fill_cart(3)
+        url = reverse('shopper_summary')
+        self.assertEqual(self.client.get(url).json(), {'cart_count': 6, 'wishlist_count': 0})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse([q for q in queries if 'carts_cartitem' in q['sql'] or 'wishlist_wishlistitem' in q['sql']])
+
+        self.client.post(reverse('carts:add_to_cart'), {'model': 'pet', 'object_id': self.pets[10].pk})
+        self.assertEqual(self.client.get(url).json()['cart_count'], 7)
+
+    def test_summary_is_lazy_and_memoized_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.session = SessionStore()
+        request.session.create()
+        Cart.objects.create(cart_id=request.session.session_key, item_count=3)
+        with self.assertNumQueries(0):
+            summary = shopper_summary(request)
+        self.assertIs(shopper_summary(request), summary)
+        with self.assertNumQueries(1):
+            self.assertEqual((summary.cart_count, summary.wishlist_count), (3, 0))
+        with self.assertNumQueries(0):
+            summary.cart_count
+
+    def test_counters_follow_cart_and_wishlist_changes(self):
+        self.client.force_login(self.user)
+        pet, product = self.pets[0], self.products[0]
+        add = reverse('carts:add_to_cart')
+        self.client.post(add, {'model': 'pet', 'object_id': pet.pk})
+        line = self.client.post(add, {'model': 'pet', 'object_id': pet.pk}).json()['item_id']
+        self.client.post(add, {'model': 'product', 'object_id': product.pk})
+        self.client.post(reverse('carts:remove_from_cart', args=[line]))
+        self.client.post(reverse('wishlist:toggle_wishlist'), {'model': 'pet', 'object_id': pet.pk})
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.cart_count, self.user.wishlist_count), (2, 1))
+
+        # Drift, e.g. from an admin edit, is repaired by reconcile_counters
+        CartItem.objects.filter(user=self.user).update(quantity=5)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Fixed the counters of 1 users and 0 guest carts', out.getvalue())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.cart_count, 10)
+
+
+@override_settings(CART_CACHE_TIMEOUT=300)
+class CartCacheTests(CartTestCase):
+
+    def cart_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('carts:view'))
+        return response, [q for q in queries if 'carts_cartitem' in q['sql']]
+
+    def test_cart_page_is_read_through_the_cache(self):
+        self.client.force_login(self.user)
+        self.fill_cart(4)
+        self.cart_queries()
+        response, queries = self.cart_queries()
+        self.assertEqual(queries, [])
+        self.assertEqual(response.context['total'], Decimal('440.00'))
+        self.assertEqual(response.context['cart_items'][0].content_object.name, 'Pup 0')
+
+        self.client.post(reverse('carts:add_to_cart'), {'model': 'pet', 'object_id': self.pets[0].pk})
+        response, queries = self.cart_queries()
+        self.assertNotEqual(queries, [])
+        self.assertEqual(response.context['total'], Decimal('540.00'))
+
+    def test_price_changes_retire_cached_carts(self):
+        self.client.force_login(self.user)
+        self.fill_cart(1)
+        self.cart_queries()
+        pet = self.pets[0]
+        pet.price = 150
+        pet.save()
+        response, _ = self.cart_queries()
+        self.assertEqual(response.context['total'], Decimal('300.00'))
+
+
+class UpdateCartTests(CartTestCase):
+
+    def update(self, *operations):
+        return self.client.post(
+            reverse('carts:update_cart'), json.dumps({'operations': list(operations)}), content_type='application/json'
+        ).json()
+
+    def test_batch_is_applied_in_one_go(self):
+        self.client.force_login(self.user)
+        self.fill_cart(4)  # pets 0-1 and products 0-1, quantity 2 each
+        pet, product = self.pets[0], self.products[0]
+
+        data = self.update(
+            {'model': 'pet', 'object_id': pet.pk, 'delta': 1},
+            {'model': 'pet', 'object_id': pet.pk, 'delta': 1},
+            {'model': 'product', 'object_id': product.pk, 'delta': -5},
+            {'model': 'pet', 'object_id': self.pets[1].pk, 'remove': True},
+            {'model': 'product', 'object_id': self.products[5].pk, 'delta': 3},
+            {'model': 'product', 'object_id': self.products[1].pk, 'delta': -1},
+        )
+
+        self.assertTrue(data['success'])
+        lines = {(item['model'], item['object_id']): item['quantity'] for item in data['items']}
+        self.assertEqual(lines, {
+            ('pet', pet.pk): 4,
+            ('product', self.products[1].pk): 1,
+            ('product', self.products[5].pk): 3,
+        })
+        self.assertEqual(Decimal(data['total']), Decimal('440.00'))
+        self.assertEqual(data['count'], 8)
+        self.assertEqual(CartItem.objects.count(), 3)
+
+    def test_invalid_batches_change_nothing(self):
+        self.client.force_login(self.user)
+        self.fill_cart(2)
+        for operations in (
+            [{'model': 'pet', 'object_id': self.pets[0].pk, 'delta': 1}, {'model': 'pet', 'object_id': 999999, 'delta': 1}],
+            [{'model': 'store', 'object_id': 1, 'delta': 1}],
+            [],
+            [{'model': 'pet', 'object_id': self.pets[0].pk, 'delta': 1.5}],
+            [{'model': 'pet', 'object_id': self.pets[0].pk, 'delta': True}],
+            [{'model': 'pet', 'object_id': self.pets[0].pk, 'delta': '1'}],
+            [{'model': 'pet', 'object_id': 10 ** 19, 'delta': 1}],
+        ):
+            self.assertFalse(self.update(*operations)['success'])
+        self.assertEqual(sorted(CartItem.objects.values_list('quantity', flat=True)), [2, 2])
+
+    def test_huge_deltas_are_clamped_to_a_full_line(self):
+        self.client.force_login(self.user)
+        self.fill_cart(1)  # pet 0, quantity 2
+        pet = self.pets[0]
+        for delta in (10 ** 19, 10 ** 12):
+            data = self.update({'model': 'pet', 'object_id': pet.pk, 'delta': delta})
+            self.assertTrue(data['success'])
+            self.assertEqual(data['count'], MAX_LINE_QUANTITY)
+        data = self.update({'model': 'product', 'object_id': self.products[0].pk, 'delta': 10 ** 12})
+        self.assertEqual(data['count'], 2 * MAX_LINE_QUANTITY)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.cart_count, 2 * MAX_LINE_QUANTITY)
+        self.assertEqual(self.update({'model': 'pet', 'object_id': pet.pk, 'delta': -(10 ** 19)})['count'], MAX_LINE_QUANTITY)
+
+    def test_add_to_cart_stops_at_a_full_line(self):
+        self.client.force_login(self.user)
+        self.fill_cart(1)
+        CartItem.objects.update(quantity=MAX_LINE_QUANTITY)
+        recount_cart(user_id=self.user.pk)
+        data = self.client.post(reverse('carts:add_to_cart'), {'model': 'pet', 'object_id': self.pets[0].pk}).json()
+        self.assertEqual((data['quantity'], data['count']), (MAX_LINE_QUANTITY, MAX_LINE_QUANTITY))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.cart_count, MAX_LINE_QUANTITY)
+
+
+class ReapCartsTests(CartTestCase):
+
+    def test_reaps_expired_sessions_and_dead_carts(self):
+        now = timezone.now()
+        Session.objects.create(session_key='live', session_data='', expire_date=now + timedelta(days=1))
+        Session.objects.create(session_key='gone', session_data='', expire_date=now - timedelta(days=1))
+        live = Cart.objects.create(cart_id='live')
+        dead = Cart.objects.create(cart_id='gone')
+        pet_type = ContentType.objects.get_for_model(Pet)
+        for cart in (live, dead):
+            CartItem.objects.create(cart=cart, content_type=pet_type, object_id=self.pets[0].pk)
+        CartItem.objects.create(cart=live, content_type=pet_type, object_id=self.pets[1].pk, active=False)
+        CartItem.objects.create(user=self.user, cart=self.cart, content_type=pet_type, object_id=self.pets[2].pk)
+        CartItem.objects.create(user=self.user, cart=self.cart, content_type=pet_type, object_id=999999)
+
+        out = StringIO()
+        call_command('reap_carts', batch_size=1, stdout=out)
+
+        self.assertIn('Reaped 1 sessions, 1 guest carts and 3 cart items', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+        self.assertEqual(set(Cart.objects.all()), {live, self.cart})
+        self.assertEqual(
+            sorted(CartItem.objects.values_list('object_id', flat=True)), [self.pets[0].pk, self.pets[2].pk]
+        )
+
+    def test_recounts_the_badges_of_owners_that_lost_lines(self):
+        pet_type = ContentType.objects.get_for_model(Pet)
+        guest = Cart.objects.create(cart_id='guest')
+        for owner in ({'user': self.user, 'cart': self.cart}, {'cart': guest}):
+            CartItem.objects.create(content_type=pet_type, object_id=self.pets[0].pk, quantity=2, **owner)
+            CartItem.objects.create(content_type=pet_type, object_id=999999, **owner)
+        recount_cart(user_id=self.user.pk)
+        Cart.objects.filter(pk=guest.pk).update(item_count=3)
+
+        out = StringIO()
+        with self.settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies'):
+            call_command('reap_carts', stdout=out)
+
+        self.assertIn('fixed 2 cart counters', out.getvalue())
+        self.user.refresh_from_db()
+        guest.refresh_from_db()
+        self.assertEqual((self.user.cart_count, guest.item_count), (2, 2))
+
+    def test_reaps_idle_guest_carts_without_database_sessions(self):
+        long_ago = timezone.now() - timedelta(seconds=settings.SESSION_COOKIE_AGE + 60)
+        busy = Cart.objects.create(cart_id='busy')
+        idle = Cart.objects.create(cart_id='idle')
+        Cart.objects.filter(pk__in=[busy.pk, idle.pk]).update(date_added=long_ago, last_active=long_ago)
+        adjust_cart_count(1, cart_id=busy.pk)  # an old cart still in use
+
+        out = StringIO()
+        with self.settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies'):
+            call_command('reap_carts', stdout=out)
+
+        self.assertIn('1 guest carts', out.getvalue())
+        self.assertEqual(set(Cart.objects.all()), {busy, self.cart})
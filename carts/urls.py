@@ -8,6 +8,7 @@ urlpatterns = [
     path("add/", views.add_to_cart, name="add_to_cart"),  # POST with model & object_id
     path("remove/<int:item_id>/", views.remove_from_cart, name="remove_from_cart"),
     path("delete/<int:item_id>/", views.delete_cart_item, name="delete_cart_item"),
+    path("update/", views.update_cart, name="update_cart"),  # POST JSON {"operations": [...]}
     path('count/', views.cart_count_api, name='cart_count_api'),
 
 ]
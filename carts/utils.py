@@ -1,8 +1,36 @@
 # carts/utils.py
 
+from .models import Cart, CartItem
+
+
 def _cart_id(request):
+    """
+    Key of the session the guest cart is filed under, creating the session
+    if there is none yet. Only call it when about to write to the cart.
+    """
     cart_id = request.session.session_key
     if not cart_id:
         request.session.create()
         cart_id = request.session.session_key
     return cart_id
+
+
+def guest_cart(request):
+    """
+    The guest cart of the current session, or None. Never creates a
+    session, and costs no query for visitors without one.
+    """
+    cart_id = request.session.session_key
+    if not cart_id:
+        return None
+    return Cart.objects.filter(cart_id=cart_id).first()
+
+
+def shopper_cart_items(request):
+    """Active cart items of the signed-in user, else of the session's cart."""
+    if request.user.is_authenticated:
+        return CartItem.objects.filter(user=request.user, active=True)
+    cart_id = request.session.session_key
+    if not cart_id:
+        return CartItem.objects.none()
+    return CartItem.objects.filter(cart__cart_id=cart_id, active=True)
@@ -1,65 +1,59 @@
+import json
+
 from django.shortcuts import render, get_object_or_404
-from django.contrib.contenttypes.models import ContentType
 from django.db import transaction
-from django.db.models import F, Sum
+from django.db.models import Case, F, PositiveIntegerField, Q, Value, When
+from django.db.models.functions import Greatest
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 
-from .models import Cart, CartItem
-from .utils import _cart_id
-from shop.models import Pet, Product
-
-CARTABLE_MODELS = {
-    "pet": Pet,
-    "product": Product,
-}
+from .counters import adjust_cart_count, recount_cart
+from .merge import merge_guest_cart
+from .models import MAX_LINE_QUANTITY, Cart, CartItem
+from .store import cart_summary
+from .utils import _cart_id, shopper_cart_items
+from core.shopper import shopper_changed, shopper_summary
+from shop.cartables import get_cartable
 
-def get_cartable_object(model_name, object_id):
-    try:
-        model = CARTABLE_MODELS[model_name]
-        obj = model.objects.get(pk=object_id)
-        return obj, ContentType.objects.get_for_model(obj)
-    except (KeyError, model.DoesNotExist):
-        return None, None
+def writable_cart(request):
+    """The cart new lines go in: the user's, else the session's, created if needed."""
+    if request.user.is_authenticated:
+        cart = Cart.objects.filter(user=request.user).first()
+        if cart is None:
+            cart = Cart.objects.create(user=request.user, cart_id=_cart_id(request))
+        return cart
+    cart, _ = Cart.objects.get_or_create(cart_id=_cart_id(request), user=None)
+    return cart
 
 def get_cart_items_and_totals(request):
-    if request.user.is_authenticated:
-        cart_items = CartItem.objects.filter(user=request.user, active=True)
-    else:
-        cart = Cart.objects.filter(cart_id=_cart_id(request)).first()
-        cart_items = CartItem.objects.filter(cart=cart, active=True) if cart else []
-    total = sum(item.subtotal() for item in cart_items)
-    quantity = sum(item.quantity for item in cart_items)
+    cart_items, quantity, total = cart_summary(request)
     return cart_items, total, quantity
 
 def remove_from_cart(request, item_id):
     if request.method == "POST":
         cart_item = get_object_or_404(CartItem, id=item_id)
-        if cart_item.quantity > 1:
-            with transaction.atomic():
+        with transaction.atomic():
+            if cart_item.quantity > 1:
                 cart_item.quantity = F("quantity") - 1
                 cart_item.save()
                 cart_item.refresh_from_db()
-            remaining = True
-        else:
-            cart_item.delete()
-            remaining = False
+                remaining = True
+            else:
+                cart_item.delete()
+                remaining = False
+            if cart_item.active:
+                adjust_cart_count(-1, user_id=cart_item.user_id, cart_id=cart_item.cart_id)
+        shopper_changed(request)
 
         # Find matching cart items & compute totals after removal
-        if request.user.is_authenticated:
-            cart_items = CartItem.objects.filter(user=request.user, active=True)
-        else:
-            cart = Cart.objects.filter(cart_id=_cart_id(request)).first()
-            cart_items = CartItem.objects.filter(cart=cart, active=True) if cart else []
-        total = sum(item.subtotal() for item in cart_items)
-        count = cart_items.aggregate(total=Sum('quantity'))['total'] or 0
+        count, total = shopper_cart_items(request).totals()
 
         return JsonResponse({
             "success": True,
             "item_id": item_id,
             "quantity": cart_item.quantity if remaining else 0,
-            "subtotal": float(cart_item.subtotal()) if remaining else 0,
-            "total": float(total),
+            "subtotal": cart_item.subtotal() if remaining else 0,
+            "total": total,
             "total_qty": count,
             "count": count
         })
@@ -68,21 +62,19 @@ def remove_from_cart(request, item_id):
 def delete_cart_item(request, item_id):
     if request.method == "POST":
         cart_item = get_object_or_404(CartItem, id=item_id)
-        cart_item.delete()
+        with transaction.atomic():
+            cart_item.delete()
+            if cart_item.active:
+                adjust_cart_count(-cart_item.quantity, user_id=cart_item.user_id, cart_id=cart_item.cart_id)
+        shopper_changed(request)
         # Compute new totals after delete
-        if request.user.is_authenticated:
-            cart_items = CartItem.objects.filter(user=request.user, active=True)
-        else:
-            cart = Cart.objects.filter(cart_id=_cart_id(request)).first()
-            cart_items = CartItem.objects.filter(cart=cart, active=True) if cart else []
-        total = sum(item.subtotal() for item in cart_items)
-        count = cart_items.aggregate(total=Sum('quantity'))['total'] or 0
+        count, total = shopper_cart_items(request).totals()
         return JsonResponse({
             "success": True,
             "item_id": item_id,
             "quantity": 0,
             "subtotal": 0,
-            "total": float(total),
+            "total": total,
             "total_qty": count,
             "count": count
         })
@@ -95,120 +87,157 @@ def view_cart(request):
 
 @login_required
 def merge_cart(request):
-    try:
-        session_cart = Cart.objects.get(cart_id=_cart_id(request))
-        session_cart_items = CartItem.objects.filter(cart=session_cart)
-        user_cart_items = CartItem.objects.filter(user=request.user)
-        for s_item in session_cart_items:
-            same_item = user_cart_items.filter(
-                content_type=s_item.content_type, object_id=s_item.object_id
-            ).first()
-            if same_item:
-                with transaction.atomic():
-                    same_item.quantity = F("quantity") + s_item.quantity
-                    same_item.save()
-                    same_item.refresh_from_db()
-                s_item.delete()
-            else:
-                s_item.user = request.user
-                s_item.cart = None
-                s_item.save()
-        session_cart.delete()
-    except Cart.DoesNotExist:
-        pass
+    merge_guest_cart(request.session.session_key, request.user)
+    shopper_changed(request)
 
 def cart_count_api(request):
-    count = 0
-    if request.user.is_authenticated:
-        cart = Cart.objects.filter(user=request.user).first()
-    else:
-        cart = Cart.objects.filter(cart_id=_cart_id(request)).first()
-    if cart:
-        count = CartItem.objects.filter(cart=cart, active=True).aggregate(total=Sum('quantity'))['total'] or 0
-    return JsonResponse({"count": count})
+    return JsonResponse({"count": shopper_summary(request).cart_count})
 
 def add_to_cart(request):
     if request.method != "POST":
         return JsonResponse({"success": False, "error": "POST request required."})
 
-    model = request.POST.get("model")
-    object_id = request.POST.get("object_id")
-    obj, content_type = get_cartable_object(model, object_id)
-    if not obj or not content_type:
+    cartable = get_cartable(request.POST.get("model"))
+    try:
+        object_id = int(request.POST.get("object_id"))
+    except (TypeError, ValueError):
+        object_id = None
+    if not cartable or object_id is None:
         return JsonResponse({"success": False, "error": "Invalid item."})
 
-    if request.user.is_authenticated:
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        cart_item = CartItem.objects.filter(
-            user=request.user,
-            content_type=content_type,
-            object_id=obj.id,
-            cart=cart
-        ).first()
-
-        if cart_item:
-            if not cart_item.active:
-                cart_item.active = True
-                cart_item.quantity = 1  # or desired default
-                cart_item.save()
-            else:
-                with transaction.atomic():
-                    cart_item.quantity = F("quantity") + 1
-                    cart_item.save()
-                    cart_item.refresh_from_db()
-        else:
-            cart_item = CartItem.objects.create(
-                user=request.user,
-                content_type=content_type,
-                object_id=obj.id,
-                cart=cart,
-                quantity=1,
-                active=True,
-            )
-        cart_items = CartItem.objects.filter(cart=cart, active=True)
-        count = cart_items.aggregate(total=Sum("quantity"))["total"] or 0
-        total = sum(item.subtotal() for item in cart_items)
-
-    else:
-        cart, _ = Cart.objects.get_or_create(cart_id=_cart_id(request), user=None)
-        cart_item = CartItem.objects.filter(
-            cart=cart,
-            user=None,
-            content_type=content_type,
-            object_id=obj.id,
-        ).first()
-
-        if cart_item:
-            if not cart_item.active:
-                cart_item.active = True
-                cart_item.quantity = 1
-                cart_item.save()
-            else:
-                with transaction.atomic():
-                    cart_item.quantity = F("quantity") + 1
-                    cart_item.save()
-                    cart_item.refresh_from_db()
-        else:
-            cart_item = CartItem.objects.create(
-                cart=cart,
-                user=None,
-                content_type=content_type,
-                object_id=obj.id,
-                quantity=1,
-                active=True,
-            )
-        cart_items = CartItem.objects.filter(cart=cart, active=True)
-        count = cart_items.aggregate(total=Sum("quantity"))["total"] or 0
-        total = sum(item.subtotal() for item in cart_items)
+    cart = writable_cart(request)
+    user = request.user if request.user.is_authenticated else None
+    with transaction.atomic():
+        line = CartItem.add_one(cartable, object_id, cart, user=user)
+        if line is not None and line[1] > MAX_LINE_QUANTITY:
+            # Already full: undo the extra unit
+            CartItem.objects.filter(pk=line[0]).update(quantity=MAX_LINE_QUANTITY)
+            line = (line[0], MAX_LINE_QUANTITY)
+        elif line is not None:
+            adjust_cart_count(1, user_id=user.pk if user else None, cart_id=cart.pk)
+
+    if line is None:
+        return JsonResponse({"success": False, "error": "Invalid item."})
+    shopper_changed(request)
+    item_id, quantity = line
+    count, total, subtotal = CartItem.objects.filter(cart=cart, active=True).totals_with_line(item_id)
 
     return JsonResponse(
         {
             "success": True,
             "count": count,
-            "total": float(total),
-            "item_id": cart_item.id,
-            "quantity": cart_item.quantity,
-            "subtotal": float(cart_item.subtotal()),
+            "total": total,
+            "item_id": item_id,
+            "quantity": quantity,
+            "subtotal": subtotal,
             "total_qty": count,
         }
     )
+
+# --------------------------
+# Batched cart updates
+# --------------------------
+MAX_BATCH_OPERATIONS = 100
+MAX_OBJECT_ID = 2 ** 63 - 1
+
+def parse_cart_operations(body):
+    """
+    Read a batch of {"model", "object_id", "delta"} operations, where a
+    "remove": true operation deletes the line, into {(Cartable, object_id):
+    delta}, summing the deltas of repeated lines; None removes the line.
+    Return None if the batch is malformed.
+    """
+    try:
+        operations = json.loads(body)["operations"]
+    except (ValueError, TypeError, KeyError):
+        return None
+    if not isinstance(operations, list) or not 0 < len(operations) <= MAX_BATCH_OPERATIONS:
+        return None
+
+    changes = {}
+    for operation in operations:
+        try:
+            cartable = get_cartable(operation["model"])
+            object_id = int(operation["object_id"])
+            delta = None if operation.get("remove") else operation["delta"]
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return None
+        # Whole numbers only: no floats, strings or booleans
+        if cartable is None or not 0 < object_id <= MAX_OBJECT_ID:
+            return None
+        if delta is not None and (not isinstance(delta, int) or isinstance(delta, bool)):
+            return None
+        key = (cartable, object_id)
+        if delta is None or changes.get(key, 0) is None:
+            changes[key] = None
+        else:
+            # No line ever moves by more than it can hold
+            total = changes.get(key, 0) + delta
+            changes[key] = max(-MAX_LINE_QUANTITY, min(total, MAX_LINE_QUANTITY))
+    return changes
+
+def update_cart(request):
+    """
+    Apply a JSON batch of cart operations in one transaction, with one
+    upsert for the lines that grow and one UPDATE and one DELETE for the
+    lines that shrink, then answer with a snapshot of the whole cart.
+    """
+    if request.method != "POST":
+        return JsonResponse({"success": False, "error": "POST request required."})
+    changes = parse_cart_operations(request.body)
+    if changes is None:
+        return JsonResponse({"success": False, "error": "Invalid operations."})
+
+    additions = [(cartable, object_id, delta) for (cartable, object_id), delta in changes.items() if delta and delta > 0]
+    for cartable in {cartable for cartable, _, _ in additions}:
+        wanted = {object_id for added, object_id, _ in additions if added is cartable}
+        if cartable.existing_ids(wanted) != wanted:
+            return JsonResponse({"success": False, "error": "Invalid item."})
+
+    reductions, shrinking, removals = [], Q(), Q()
+    for (cartable, object_id), delta in changes.items():
+        line = Q(content_type_id=cartable.content_type_id, object_id=object_id)
+        if delta is None:
+            removals |= line
+        elif delta < 0:
+            reduced = Greatest(F("quantity") + delta, Value(0), output_field=PositiveIntegerField())
+            reductions.append(When(line, then=reduced))
+            shrinking |= line
+
+    with transaction.atomic():
+        if additions:
+            user = request.user if request.user.is_authenticated else None
+            CartItem.add_many(
+                [(cartable.content_type_id, object_id, delta) for cartable, object_id, delta in additions],
+                writable_cart(request), user=user,
+            )
+        items = shopper_cart_items(request)
+        if additions:
+            items.filter(quantity__gt=MAX_LINE_QUANTITY).update(quantity=MAX_LINE_QUANTITY)
+        if reductions:
+            items.filter(shrinking).update(quantity=Case(*reductions, default=F("quantity")))
+        if reductions or removals:
+            items.filter(removals | Q(quantity=0)).delete()
+        if request.user.is_authenticated:
+            recount_cart(user_id=request.user.pk)
+        else:
+            recount_cart(session_key=request.session.session_key)
+    shopper_changed(request)
+
+    cart_items, quantity, total = cart_summary(request)
+    return JsonResponse({
+        "success": True,
+        "items": [
+            {
+                "item_id": item.id,
+                "model": item.content_type.model,
+                "object_id": item.object_id,
+                "quantity": item.quantity,
+                "subtotal": item.subtotal(),
+            }
+            for item in cart_items
+        ],
+        "total": total,
+        "total_qty": quantity,
+        "count": quantity,
+    })
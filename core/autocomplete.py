@@ -0,0 +1,78 @@
+# core/autocomplete.py
+
+from bisect import bisect_left
+
+from django.urls import reverse
+
+from .search_backends import get_search_backend
+from .search_cache import search_cache
+from .utils import PET_KEYWORDS, CATEGORY_KEYWORDS
+
+# Sorted vocabulary of the known filter keywords, for prefix completion
+KEYWORD_VOCAB = sorted(set(PET_KEYWORDS + CATEGORY_KEYWORDS))
+
+PRODUCT_LIMIT = 5
+PET_LIMIT = 3
+STORE_LIMIT = 3
+
+
+def complete_keyword(prefix):
+    """Return the filter keywords starting with prefix."""
+    i = bisect_left(KEYWORD_VOCAB, prefix)
+    matches = []
+    while i < len(KEYWORD_VOCAB) and KEYWORD_VOCAB[i].startswith(prefix):
+        matches.append(KEYWORD_VOCAB[i])
+        i += 1
+    return matches
+
+
+def suggest(term):
+    """
+    Build the autocomplete suggestions for term, retrying with corrected
+    spelling when nothing matches. With the in-memory backend this does
+    not touch the database.
+
+    Results are cached per typed term; word order and partial words
+    matter here, so the term is only split on whitespace for the key.
+    """
+    keywords = term.split()
+    if not keywords:
+        return []
+    return search_cache.get_or_compute(('suggest', tuple(keywords)), lambda: _suggest_with_correction(keywords))
+
+
+def _suggest_with_correction(keywords):
+    backend = get_search_backend()
+    results = _suggest(backend, keywords)
+    if not results:
+        corrected = backend.correct(keywords)
+        if corrected:
+            results = _suggest(backend, corrected)
+    return results
+
+
+def _suggest(backend, keywords):
+    # A partially typed filter keyword ("medic") counts as the keyword when
+    # it can only complete to one of them.
+    filter_keywords = list(keywords)
+    completions = complete_keyword(keywords[-1])
+    if keywords[-1] not in KEYWORD_VOCAB and len(completions) == 1:
+        filter_keywords[-1] = completions[0]
+
+    if any(kw in KEYWORD_VOCAB for kw in filter_keywords):
+        product_pks = backend.search('product', filter_keywords, limit=PRODUCT_LIMIT)
+        names = backend.names('product', product_pks)
+        products = [(pk, names[pk]) for pk in product_pks if pk in names]
+    else:
+        products = backend.prefix_search('product', keywords, PRODUCT_LIMIT)
+    pets = backend.prefix_search('pet', keywords, PET_LIMIT)
+    stores = backend.prefix_search('store', keywords, STORE_LIMIT)
+
+    results = []
+    for pk, name in products:
+        results.append({'label': f'Product: {name}', 'url': reverse('shop:product_detail', args=[pk])})
+    for pk, name in pets:
+        results.append({'label': f'Pet: {name}', 'url': reverse('shop:pet_detail', args=[pk])})
+    for pk, name in stores:
+        results.append({'label': f'Store: {name}', 'url': reverse('shop:store_detail', args=[pk])})
+    return results
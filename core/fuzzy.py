@@ -0,0 +1,95 @@
+# core/fuzzy.py
+
+"""
+Trigram similarity over the search vocabulary, used to correct misspelled
+keywords ("retreiver", "aquarim") when the exact lookup finds nothing.
+"""
+
+from collections import Counter, defaultdict
+
+from .utils import normalize_term
+
+# Minimum Jaccard similarity of trigram sets for a word to be suggested
+SIMILARITY_THRESHOLD = 0.3
+# Only words this much shorter/longer than the typed one are considered
+MAX_LENGTH_DIFFERENCE = 3
+# Words sharing the most trigrams that are scored exactly
+MAX_CANDIDATES = 50
+# Trigrams shared by more words than this are too common to be useful
+MAX_TRIGRAM_POSTINGS = 5000
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Trigram postings over a reference-counted set of words."""
+
+    def __init__(self):
+        self._refs = Counter()
+        self._postings = defaultdict(set)
+
+    def __contains__(self, word):
+        return word in self._refs
+
+    def add(self, word):
+        if not self._refs[word]:
+            for gram in trigrams(word):
+                self._postings[gram].add(word)
+        self._refs[word] += 1
+
+    def discard(self, word):
+        if word not in self._refs:
+            return
+        self._refs[word] -= 1
+        if self._refs[word] <= 0:
+            del self._refs[word]
+            for gram in trigrams(word):
+                words = self._postings.get(gram)
+                if words is not None:
+                    words.discard(word)
+                    if not words:
+                        del self._postings[gram]
+
+    def similar(self, word, limit=3):
+        """Return up to limit known words most similar to word, best first."""
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            words = self._postings.get(gram)
+            if not words or len(words) > MAX_TRIGRAM_POSTINGS:
+                continue
+            for candidate in words:
+                if abs(len(candidate) - len(word)) <= MAX_LENGTH_DIFFERENCE:
+                    shared[candidate] += 1
+
+        scored = []
+        for candidate, count in shared.most_common(MAX_CANDIDATES):
+            similarity = count / (len(grams) + len(trigrams(candidate)) - count)
+            if similarity >= SIMILARITY_THRESHOLD:
+                scored.append((similarity, candidate))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [candidate for _, candidate in scored[:limit]]
+
+
+def correct_keywords(index, keywords):
+    """
+    Replace keywords that match no word of index (in any plural/singular
+    form) with the most similar word. Return the corrected keywords, or
+    None when nothing could be corrected.
+    """
+    corrected = []
+    changed = False
+    for kw in keywords:
+        if any(variant in index for variant in normalize_term(kw)):
+            corrected.append(kw)
+            continue
+        similar = index.similar(kw, limit=1)
+        if similar:
+            corrected.append(similar[0])
+            changed = True
+        else:
+            corrected.append(kw)
+    return corrected if changed else None
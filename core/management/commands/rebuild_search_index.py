@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.search_backends import get_search_backend
+
+
+class Command(BaseCommand):
+    help = (
+        "Repopulate the configured search backend from the catalog. "
+        "The in-memory backend is rebuilt by each web process on startup "
+        "and whenever another process changed the catalog, so this is only "
+        "needed for the database backends."
+    )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        started = time.monotonic()
+        counts = backend.rebuild()
+        elapsed = time.monotonic() - started
+
+        summary = ', '.join(f"{count} {kind}s" for kind, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {type(backend).__name__} index: {summary} in {elapsed:.2f}s"
+        ))
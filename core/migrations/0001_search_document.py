@@ -0,0 +1,42 @@
+from django.db import migrations
+
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS core_search_document USING fts5("
+    "kind, name, category, pet_category, object_id UNINDEXED, prefix='2 3')",
+]
+
+POSTGRES_CREATE = [
+    "CREATE TABLE IF NOT EXISTS core_search_document ("
+    "id bigint PRIMARY KEY, "
+    "kind varchar(16) NOT NULL, "
+    "object_id bigint NOT NULL, "
+    "name text NOT NULL, "
+    "category text NOT NULL DEFAULT '', "
+    "pet_category text NOT NULL DEFAULT '', "
+    "document tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', name), 'A') || "
+    "setweight(to_tsvector('simple', category), 'B') || "
+    "setweight(to_tsvector('simple', pet_category), 'C')) STORED)",
+    "CREATE INDEX IF NOT EXISTS core_search_document_gin ON core_search_document USING GIN (document)",
+]
+
+
+def create_search_table(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_CREATE, 'postgresql': POSTGRES_CREATE}.get(vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS core_search_document")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = []
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
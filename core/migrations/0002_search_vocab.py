@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def create_vocab_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS core_search_vocab "
+            "USING fts5vocab(core_search_document, row)"
+        )
+
+
+def drop_vocab_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS core_search_vocab")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_search_document'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_vocab_table, drop_vocab_table),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+def create_generation_row(apps, schema_editor):
+    apps.get_model('core', 'CatalogGeneration').objects.create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_search_vocab'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generation', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_generation_row, migrations.RunPython.noop),
+    ]
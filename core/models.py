@@ -1,3 +1,24 @@
 from django.db import models
+from django.db.models import F
 
-# Create your models here.
+
+class CatalogGeneration(models.Model):
+    """
+    Single row counting changes to the searchable catalog, shared by every
+    process. Processes holding an in-memory search index compare it with
+    the generation they loaded to notice changes made elsewhere (other
+    workers, the admin, management commands or a shell).
+    """
+    generation = models.PositiveBigIntegerField(default=0)
+
+    ROW = 1
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=cls.ROW).values_list('generation', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls):
+        """Count one catalog change; return the new generation."""
+        cls.objects.filter(pk=cls.ROW).update(generation=F('generation') + 1)
+        return cls.current()
@@ -0,0 +1,189 @@
+# core/pagination.py
+
+"""
+Keyset (cursor) pagination for catalog listings.
+
+Instead of counting the rows and skipping OFFSET rows, a page is fetched
+with a WHERE clause on the ordering keys of the row it starts after (or
+before), so every page costs the same as the first one. The position is
+passed around as an opaque, signed ``cursor`` query parameter.
+
+The ordering keys must be non-null model fields; the primary key is added
+as a final tie-breaker when it is not already part of the ordering.
+"""
+
+import hashlib
+
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+
+CURSOR_SALT = 'core.pagination.cursor'
+# Seconds an approximate total is reused before counting again
+COUNT_CACHE_TIMEOUT = 300
+
+
+def approximate_count(queryset):
+    """
+    Return a cheap estimate of queryset.count(): the planner's row estimate
+    for unfiltered PostgreSQL tables, otherwise a count cached for
+    COUNT_CACHE_TIMEOUT seconds.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return int(row[0])
+
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    digest = hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+    return cache.get_or_set(f'approx-count:{digest}', queryset.count, COUNT_CACHE_TIMEOUT)
+
+
+class InvalidCursor(ValueError):
+    """A cursor that was tampered with or does not belong to the paginator."""
+
+
+class CursorPage:
+    """One page of a CursorPaginator, iterable like a Paginator page."""
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor, count=None):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+        self.next_query = ''
+        self.previous_query = ''
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class CursorPaginator:
+
+    def __init__(self, queryset, ordering, per_page, with_count=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.with_count = with_count
+
+        model = queryset.model
+        self.keys = []  # (field, descending)
+        for name in ordering:
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            self.keys.append((field, descending))
+        if not any(field.primary_key for field, _ in self.keys):
+            self.keys.append((model._meta.pk, False))
+
+    def _order_by(self, reverse=False):
+        return [
+            f"{'-' if descending != reverse else ''}{field.name}"
+            for field, descending in self.keys
+        ]
+
+    def _encode(self, obj, backwards):
+        values = []
+        for field, _ in self.keys:
+            value = getattr(obj, field.attname)
+            values.append(value if isinstance(value, (int, str)) else str(value))
+        return signing.dumps([values, backwards], salt=CURSOR_SALT, compress=True)
+
+    def _decode(self, cursor):
+        """Return (values, backwards) for a cursor, or None if it is invalid."""
+        if not cursor:
+            return None
+        try:
+            values, backwards = signing.loads(cursor, salt=CURSOR_SALT)
+            if len(values) != len(self.keys):
+                return None
+            values = [field.to_python(value) for (field, _), value in zip(self.keys, values)]
+        except (signing.BadSignature, ValidationError, TypeError, ValueError):
+            return None
+        return values, bool(backwards)
+
+    def _beyond(self, values, backwards):
+        """Rows after values in the ordering (or before them, if backwards)."""
+        condition = Q()
+        equal = Q()
+        for (field, descending), value in zip(self.keys, values):
+            lookup = 'lt' if descending != backwards else 'gt'
+            condition |= equal & Q(**{f'{field.name}__{lookup}': value})
+            equal &= Q(**{field.name: value})
+        return condition
+
+    def get_page(self, cursor=None, strict=False):
+        """
+        Return the page at cursor. Invalid cursors give the first page, or
+        raise InvalidCursor when strict.
+        """
+        size = self.per_page
+        position = self._decode(cursor)
+        if position is None and cursor and strict:
+            raise InvalidCursor(cursor)
+
+        if position is None:
+            rows = list(self.queryset.order_by(*self._order_by())[:size + 1])
+            has_next, has_previous = len(rows) > size, False
+            rows = rows[:size]
+        else:
+            values, backwards = position
+            qs = self.queryset.filter(self._beyond(values, backwards))
+            rows = list(qs.order_by(*self._order_by(reverse=backwards))[:size + 1])
+            if backwards:
+                has_next, has_previous = True, len(rows) > size
+                rows = rows[:size][::-1]
+            else:
+                has_next, has_previous = len(rows) > size, True
+                rows = rows[:size]
+
+        return CursorPage(
+            rows,
+            has_next=has_next and bool(rows),
+            has_previous=has_previous and bool(rows),
+            next_cursor=self._encode(rows[-1], False) if has_next and rows else None,
+            previous_cursor=self._encode(rows[0], True) if has_previous and rows else None,
+            count=approximate_count(self.queryset) if self.with_count else None,
+        )
+
+
+def paginate_by_cursor(request, queryset, ordering, per_page, with_count=False, param='cursor'):
+    """
+    Return the CursorPage of queryset for request's cursor parameter, with
+    next_query/previous_query set to the request's query string pointing
+    at the neighbouring pages.
+    """
+    page = CursorPaginator(queryset, ordering, per_page, with_count).get_page(request.GET.get(param))
+
+    for attr, cursor in (('next_query', page.next_cursor), ('previous_query', page.previous_cursor)):
+        params = request.GET.copy()
+        params.pop(param, None)
+        params.pop('page', None)
+        if cursor:
+            params[param] = cursor
+        setattr(page, attr, params.urlencode())
+    return page
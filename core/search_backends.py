@@ -0,0 +1,409 @@
+# core/search_backends.py
+
+"""
+Search backends used by site search and autocomplete.
+
+The backend is chosen with the SEARCH_BACKEND setting:
+
+- MemorySearchBackend: the in-process inverted index (default)
+- SQLiteFTSSearchBackend: an FTS5 virtual table, for SQLite databases
+- PostgresSearchBackend: a GIN-indexed tsvector table, for PostgreSQL
+
+All backends are kept in sync by the receivers in core/signals.py and can
+be repopulated with ``manage.py rebuild_search_index``.
+"""
+
+import functools
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+from shop.models import Pet, PetCategory, Product, ProductCategory, Store
+from .fuzzy import TrigramIndex, correct_keywords
+from .search_index import search_index
+from .utils import PET_KEYWORDS, CATEGORY_KEYWORDS, normalize_term, tokenize
+
+DEFAULT_SEARCH_BACKEND = 'core.search_backends.MemorySearchBackend'
+
+KIND_MODELS = {
+    'product': Product,
+    'pet': Pet,
+    'store': Store,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_search_backend():
+    """Return the configured search backend instance (one per process)."""
+    backend_path = getattr(settings, 'SEARCH_BACKEND', DEFAULT_SEARCH_BACKEND)
+    return import_string(backend_path)()
+
+
+def term_variants(keywords):
+    """Tokenize keywords and add the plural/singular variant of each word."""
+    variants = []
+    for kw in keywords:
+        for token in tokenize(kw):
+            variants.extend(v for v in normalize_term(token) if v and v not in variants)
+    return variants
+
+
+class BaseSearchBackend:
+    """
+    Interface shared by all search backends. Each kind of result
+    ('product', 'pet', 'store') is searched, counted and paged separately.
+    """
+
+    def warm(self):
+        """Prepare the backend before serving requests."""
+
+    def rebuild(self):
+        """Repopulate the index from the catalog; return rows per kind."""
+        raise NotImplementedError
+
+    def search(self, kind, keywords, offset=0, limit=None):
+        """Return the pks of kind matching keywords, best first, sliced to the page."""
+        raise NotImplementedError
+
+    def count(self, kind, keywords):
+        """Return the number of docs of kind matching keywords."""
+        raise NotImplementedError
+
+    def prefix_search(self, kind, prefixes, limit):
+        """Return (pk, name) pairs whose names have a word starting with a prefix."""
+        raise NotImplementedError
+
+    def correct(self, keywords):
+        """Return keywords with misspelled words corrected, or None."""
+        return None
+
+    def names(self, kind, pks):
+        return dict(KIND_MODELS[kind].objects.filter(pk__in=pks).values_list('pk', 'name'))
+
+    def match_store(self, query):
+        """Return the pk of the store whose name equals, else contains, query."""
+        store = Store.objects.filter(name__iexact=query).first()
+        if not store:
+            store = Store.objects.filter(name__icontains=query).first()
+        return store.pk if store else None
+
+    # --------------------------
+    # Sync hooks, called from core/signals.py
+    # --------------------------
+    def update_doc(self, kind, instance):
+        pass
+
+    def remove_doc(self, kind, pk):
+        pass
+
+    def update_category(self, category):
+        pass
+
+    def remove_category(self, pk):
+        pass
+
+    def update_pet_category(self, pet_category):
+        pass
+
+    def remove_pet_category(self, pk):
+        pass
+
+
+# --------------------------
+# In-process inverted index
+# --------------------------
+class MemorySearchBackend(BaseSearchBackend):
+
+    def __init__(self):
+        self.index = search_index
+
+    def warm(self):
+        self.index.ensure_built()
+
+    def rebuild(self):
+        self.index.build()
+        return {kind: len(self.index._docs[kind]) for kind in self.index.KINDS}
+
+    def search(self, kind, keywords, offset=0, limit=None):
+        self.index.ensure_built()
+        return self.index.search(kind, keywords, offset, limit)[0]
+
+    def count(self, kind, keywords):
+        self.index.ensure_built()
+        return self.index.count(kind, keywords)
+
+    def prefix_search(self, kind, prefixes, limit):
+        self.index.ensure_built()
+        return self.index.prefix_search(kind, prefixes, limit)
+
+    def correct(self, keywords):
+        self.index.ensure_built()
+        return self.index.correct(keywords)
+
+    def names(self, kind, pks):
+        names = {pk: self.index.doc_name(kind, pk) for pk in pks}
+        return {pk: name for pk, name in names.items() if name is not None}
+
+    def match_store(self, query):
+        self.index.ensure_built()
+        return self.index.match_store(query)
+
+    def update_doc(self, kind, instance):
+        category_id = instance.category_id if kind == 'product' else None
+        self.index.update_doc(kind, instance.pk, instance.name, category_id)
+
+    def remove_doc(self, kind, pk):
+        self.index.remove_doc(kind, pk)
+
+    def update_category(self, category):
+        self.index.update_category(category.pk, category.name, category.pet_category_id)
+
+    def remove_category(self, pk):
+        self.index.remove_category(pk)
+
+    def update_pet_category(self, pet_category):
+        self.index.update_pet_category(pet_category.pk, pet_category.name)
+
+    def remove_pet_category(self, pk):
+        self.index.remove_pet_category(pk)
+
+
+# --------------------------
+# Database full-text search
+# --------------------------
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Shared logic for the database backends. Every product, pet and store
+    is one row of the search table (created by core's migrations) with its
+    name, category name and pet category name. Row ids are derived from
+    the object pk so rows can be replaced without a lookup.
+
+    Spelling correction uses an in-process trigram index over the table's
+    vocabulary, loaded on first use. Words of newly saved items are added
+    to it; words that disappear stay until the next rebuild().
+    """
+
+    table = 'core_search_document'
+    id_column = 'id'
+    kind_codes = {'product': 0, 'pet': 1, 'store': 2}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._trigrams = None
+
+    def _doc_id(self, kind, pk):
+        return pk * len(self.kind_codes) + self.kind_codes[kind]
+
+    def _doc_id_sql(self, kind):
+        return f"o.id * {len(self.kind_codes)} + {self.kind_codes[kind]}"
+
+    def _from_sql(self, kind):
+        qn = connection.ops.quote_name
+        if kind == 'product':
+            return (
+                f"FROM {qn(Product._meta.db_table)} o "
+                f"JOIN {qn(ProductCategory._meta.db_table)} c ON c.id = o.category_id "
+                f"JOIN {qn(PetCategory._meta.db_table)} pc ON pc.id = c.pet_category_id"
+            )
+        return f"FROM {qn(KIND_MODELS[kind]._meta.db_table)} o"
+
+    def _insert_sql(self, kind):
+        categories = "c.name, pc.name" if kind == 'product' else "'', ''"
+        return (
+            f"INSERT INTO {self.table} ({self.id_column}, kind, object_id, name, category, pet_category) "
+            f"SELECT {self._doc_id_sql(kind)}, '{kind}', o.id, o.name, {categories} {self._from_sql(kind)}"
+        )
+
+    def _replace(self, kind, where, params):
+        """Re-insert the rows of kind matching where (written against o/c/pc)."""
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {self.table} WHERE {self.id_column} IN "
+                f"(SELECT {self._doc_id_sql(kind)} {self._from_sql(kind)} WHERE {where})",
+                params,
+            )
+            cursor.execute(f"{self._insert_sql(kind)} WHERE {where}", params)
+
+    def rebuild(self):
+        counts = {}
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            for kind in KIND_MODELS:
+                cursor.execute(self._insert_sql(kind))
+                counts[kind] = cursor.rowcount
+        self._trigrams = None
+        return counts
+
+    def update_doc(self, kind, instance):
+        self._replace(kind, "o.id = %s", [instance.pk])
+        trigram_index = self._trigrams
+        if trigram_index is not None:
+            with self._lock:
+                for token in tokenize(instance.name):
+                    if token not in trigram_index:
+                        trigram_index.add(token)
+
+    def remove_doc(self, kind, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {self.table} WHERE {self.id_column} = %s", [self._doc_id(kind, pk)]
+            )
+
+    def update_category(self, category):
+        self._replace('product', "c.id = %s", [category.pk])
+
+    def update_pet_category(self, pet_category):
+        self._replace('product', "pc.id = %s", [pet_category.pk])
+
+    # Deleting a category cascades to its products, whose own post_delete
+    # signals remove their rows, so remove_category/remove_pet_category
+    # have nothing left to do.
+
+    # --------------------------
+    # Queries
+    # --------------------------
+    def _any(self, columns, words, prefix=False):
+        """Expression matching any of words in any of columns."""
+        raise NotImplementedError
+
+    def _all(self, expressions):
+        raise NotImplementedError
+
+    def _match(self, kind, expression, offset=0, limit=None):
+        """Return (pk, name) rows of kind matching expression, best first."""
+        raise NotImplementedError
+
+    def _count(self, kind, expression):
+        raise NotImplementedError
+
+    def _vocabulary(self):
+        """Return every word in the search table."""
+        raise NotImplementedError
+
+    def correct(self, keywords):
+        with self._lock:
+            if self._trigrams is None:
+                trigram_index = TrigramIndex()
+                for word in self._vocabulary():
+                    trigram_index.add(word)
+                for kw in PET_KEYWORDS + CATEGORY_KEYWORDS:
+                    trigram_index.add(kw)
+                self._trigrams = trigram_index
+            return correct_keywords(self._trigrams, keywords)
+
+    def _product_expression(self, keywords):
+        pet_words = term_variants(kw for kw in keywords if kw in PET_KEYWORDS)
+        category_words = term_variants(kw for kw in keywords if kw in CATEGORY_KEYWORDS)
+        expressions = []
+        if pet_words:
+            expressions.append(self._any(['pet_category'], pet_words))
+        if category_words:
+            expressions.append(self._any(['category'], category_words))
+        if expressions:
+            return self._all(expressions)
+        words = term_variants(keywords)
+        return self._any(['name', 'category'], words) if words else None
+
+    def _expression(self, kind, keywords):
+        if kind == 'product':
+            return self._product_expression(keywords)
+        words = term_variants(keywords)
+        return self._any(['name'], words) if words else None
+
+    def search(self, kind, keywords, offset=0, limit=None):
+        expression = self._expression(kind, keywords)
+        if not expression:
+            return []
+        return [pk for pk, _ in self._match(kind, expression, offset, limit)]
+
+    def count(self, kind, keywords):
+        expression = self._expression(kind, keywords)
+        return self._count(kind, expression) if expression else 0
+
+    def prefix_search(self, kind, prefixes, limit):
+        words = [token for prefix in prefixes for token in tokenize(prefix)]
+        if not words:
+            return []
+        return self._match(kind, self._any(['name'], words, prefix=True), limit=limit)
+
+
+class SQLiteFTSSearchBackend(DatabaseSearchBackend):
+    """FTS5 virtual table ranked with bm25(), name weighted over categories."""
+
+    id_column = 'rowid'
+
+    # bm25() weights, in column order: kind, name, category, pet_category, object_id
+    column_weights = (0.0, 10.0, 5.0, 2.0, 0.0)
+
+    def _any(self, columns, words, prefix=False):
+        star = '*' if prefix else ''
+        terms = ' OR '.join(f'"{word}"{star}' for word in words)
+        return f"{{{' '.join(columns)}}} : ({terms})"
+
+    def _all(self, expressions):
+        return ' AND '.join(expressions)
+
+    def _match(self, kind, expression, offset=0, limit=None):
+        weights = ', '.join(str(w) for w in self.column_weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT object_id, name FROM {self.table} "
+                f"WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, {weights}), object_id DESC LIMIT %s OFFSET %s",
+                [f'kind : "{kind}" AND ({expression})', -1 if limit is None else limit, offset],
+            )
+            return cursor.fetchall()
+
+    def _count(self, kind, expression):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT count(*) FROM {self.table} WHERE {self.table} MATCH %s",
+                [f'kind : "{kind}" AND ({expression})'],
+            )
+            return cursor.fetchone()[0]
+
+    def _vocabulary(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT term FROM core_search_vocab")
+            return [term for (term,) in cursor.fetchall()]
+
+
+class PostgresSearchBackend(DatabaseSearchBackend):
+    """tsvector column with a GIN index, ranked with ts_rank()."""
+
+    # tsvector weight labels set on each column by the generated column
+    column_labels = {'name': 'A', 'category': 'B', 'pet_category': 'C'}
+
+    def _any(self, columns, words, prefix=False):
+        labels = ''.join(self.column_labels[column] for column in columns)
+        star = '*' if prefix else ''
+        return '(' + ' | '.join(f"{word}:{star}{labels}" for word in words) + ')'
+
+    def _all(self, expressions):
+        return ' & '.join(expressions)
+
+    def _match(self, kind, expression, offset=0, limit=None):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT object_id, name FROM {self.table}, to_tsquery('simple', %s) query "
+                f"WHERE kind = %s AND document @@ query "
+                f"ORDER BY ts_rank(document, query) DESC, object_id DESC LIMIT %s OFFSET %s",
+                [expression, kind, limit, offset],
+            )
+            return cursor.fetchall()
+
+    def _count(self, kind, expression):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT count(*) FROM {self.table} "
+                f"WHERE kind = %s AND document @@ to_tsquery('simple', %s)",
+                [kind, expression],
+            )
+            return cursor.fetchone()[0]
+
+    def _vocabulary(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT word FROM ts_stat('SELECT document FROM {self.table}')")
+            return [word for (word,) in cursor.fetchall()]
@@ -0,0 +1,127 @@
+# core/search_cache.py
+
+"""
+In-process cache for search results, keyed by the normalized query.
+
+Entries expire after SEARCH_CACHE_TIMEOUT seconds, the least recently used
+ones are evicted past SEARCH_CACHE_SIZE entries, and the whole cache is
+cleared whenever the catalog changes in this process. Concurrent misses
+for the same key are coalesced: one caller computes, the others wait for
+its result.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .utils import PET_KEYWORDS, CATEGORY_KEYWORDS, normalize_term
+
+FILTER_KEYWORDS = set(PET_KEYWORDS + CATEGORY_KEYWORDS)
+
+
+def query_key(keywords):
+    """
+    Order-independent key for a list of keywords. Words that only differ
+    by a trailing 's' share the key, since the index looks both forms up,
+    except near the filter keywords, which are matched exactly.
+    """
+    parts = []
+    for kw in keywords:
+        variants = tuple(sorted(v for v in normalize_term(kw) if v))
+        parts.append((kw,) if FILTER_KEYWORDS.intersection(variants) else variants)
+    return tuple(sorted(parts))
+
+
+class _Abandoned(Exception):
+    """The caller computing a flight was interrupted before finishing it."""
+
+
+class _Flight:
+    """A computation in progress that other callers can wait for."""
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.value = None
+        self.error = None
+        self._done = threading.Event()
+
+    def resolve(self, value=None, error=None):
+        self.value = value
+        self.error = error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class SearchCache:
+
+    def __init__(self, max_entries=1024, timeout=60):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}  # key -> _Flight
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+            flight = self._inflight.get(key)
+            if flight is None:
+                flight = self._inflight[key] = _Flight(self._generation)
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            try:
+                return flight.wait()
+            except _Abandoned:
+                return self.get_or_compute(key, compute)
+
+        value = error = None
+        try:
+            value = compute()
+        except Exception as exc:
+            error = exc
+            raise
+        except BaseException:
+            # KeyboardInterrupt, SystemExit, worker timeouts: the waiters retry
+            error = _Abandoned()
+            raise
+        finally:
+            # Always settle the flight, or every later caller for key would wait forever
+            with self._lock:
+                self._inflight.pop(key, None)
+                # Results computed while the catalog changed are not kept
+                if error is None and flight.generation == self._generation and self.timeout > 0:
+                    self._entries[key] = (time.monotonic() + self.timeout, value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            flight.resolve(value, error)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+
+search_cache = SearchCache(
+    max_entries=getattr(settings, 'SEARCH_CACHE_SIZE', 1024),
+    timeout=getattr(settings, 'SEARCH_CACHE_TIMEOUT', 60),
+)
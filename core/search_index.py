@@ -0,0 +1,465 @@
+# core/search_index.py
+
+"""
+In-process inverted index over the catalog used by site search.
+
+The index is built lazily from the database on first use and kept up to
+date by the post_save/post_delete receivers in core/signals.py. Each
+worker process holds its own copy, so every change is also counted in the
+shared CatalogGeneration row: at most every SEARCH_INDEX_CHECK_INTERVAL
+seconds the index compares it with the generation it has seen and
+rebuilds when another process changed the catalog.
+"""
+
+import functools
+import heapq
+import itertools
+import math
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.conf import settings
+
+from .fuzzy import TrigramIndex, correct_keywords
+from .utils import PET_KEYWORDS, CATEGORY_KEYWORDS, normalize_term, tokenize
+
+# Weight of a query term matching the item name vs. its category name
+NAME_WEIGHT = 2
+CATEGORY_WEIGHT = 1
+
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Upper bound on names collected per typed prefix during autocomplete
+PREFIX_CANDIDATES = 200
+
+
+def _catalog_change(method):
+    """Apply an update to the index if it is loaded, then count it in the shared generation."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._built:
+            with self._lock:
+                method(self, *args, **kwargs)
+        self._changed()
+    return wrapper
+
+
+class SearchIndex:
+    """Tokenized postings for products, pets, stores and category names."""
+
+    KINDS = ('product', 'pet', 'store')
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._loading = False
+        self._generation = None  # shared catalog generation the index reflects
+        self._checked_at = 0.0
+        self._reset()
+
+    def _reset(self):
+        # token -> set of pks, per document kind
+        self._name_postings = {kind: defaultdict(set) for kind in self.KINDS}
+        # pk -> (name, tokens, category_id), per document kind
+        self._docs = {kind: {} for kind in self.KINDS}
+        # Sorted token vocabulary per kind, used for prefix lookups
+        self._vocab = {kind: [] for kind in self.KINDS}
+        # Sum of name lengths in tokens, for the BM25 average length
+        self._name_length_total = {kind: 0 for kind in self.KINDS}
+
+        # ProductCategory / PetCategory names are indexed once per category,
+        # products are reached through the category they belong to.
+        self._category_postings = defaultdict(set)
+        self._pet_category_postings = defaultdict(set)
+        self._categories = {}  # category_id -> (tokens, pet_category_id)
+        self._pet_categories = {}  # pet_category_id -> tokens
+        self._category_products = defaultdict(set)
+        self._pet_category_categories = defaultdict(set)
+
+        # Trigrams of every indexed word plus the filter keywords, for
+        # correcting misspelled queries
+        self._trigrams = TrigramIndex()
+        for kw in PET_KEYWORDS + CATEGORY_KEYWORDS:
+            self._trigrams.add(kw)
+
+    # --------------------------
+    # Building
+    # --------------------------
+    def build(self):
+        """(Re)load every indexed row from the database."""
+        from shop.models import Pet, PetCategory, Product, ProductCategory, Store
+        from .models import CatalogGeneration
+
+        with self._lock:
+            # Read first: changes made while loading bring a later rebuild
+            generation = CatalogGeneration.current()
+            self._reset()
+            self._loading = True
+            for pk, name in PetCategory.objects.values_list('pk', 'name'):
+                self._add_pet_category(pk, name)
+            for pk, name, pet_category_id in ProductCategory.objects.values_list(
+                'pk', 'name', 'pet_category_id'
+            ):
+                self._add_category(pk, name, pet_category_id)
+            for pk, name, category_id in Product.objects.values_list('pk', 'name', 'category_id'):
+                self._add_doc('product', pk, name, category_id)
+            for pk, name in Pet.objects.values_list('pk', 'name'):
+                self._add_doc('pet', pk, name)
+            for pk, name in Store.objects.values_list('pk', 'name'):
+                self._add_doc('store', pk, name)
+            self._vocab = {kind: sorted(self._name_postings[kind]) for kind in self.KINDS}
+            self._loading = False
+            self._generation = generation
+            self._checked_at = time.monotonic()
+            self._built = True
+
+    def ensure_built(self):
+        """Build the index, or rebuild it if another process changed the catalog."""
+        if not self._built:
+            self.build()
+        elif time.monotonic() - self._checked_at >= settings.SEARCH_INDEX_CHECK_INTERVAL:
+            from .models import CatalogGeneration
+
+            self._checked_at = time.monotonic()
+            if CatalogGeneration.current() != self._generation:
+                self.build()
+
+    def _changed(self):
+        """Count a change made by this process, which the index already reflects."""
+        from .models import CatalogGeneration
+
+        generation = CatalogGeneration.bump()
+        with self._lock:
+            # Only if nobody else changed the catalog since; else the next check rebuilds
+            if self._built and generation == self._generation + 1:
+                self._generation = generation
+
+    @property
+    def is_built(self):
+        return self._built
+
+    # --------------------------
+    # Incremental updates
+    # --------------------------
+    def _post(self, postings, token, key):
+        """Add key to the postings of token; return True for a new token."""
+        new = token not in postings
+        if new:
+            self._trigrams.add(token)
+        postings[token].add(key)
+        return new
+
+    def _unpost(self, postings, token, key):
+        """Remove key from the postings of token; return True if the token is gone."""
+        keys = postings.get(token)
+        if keys is None:
+            return False
+        keys.discard(key)
+        if keys:
+            return False
+        del postings[token]
+        self._trigrams.discard(token)
+        return True
+
+    def _add_doc(self, kind, pk, name, category_id=None):
+        tokens = tokenize(name)
+        self._docs[kind][pk] = (name, tokens, category_id)
+        self._name_length_total[kind] += len(tokens)
+        postings = self._name_postings[kind]
+        for token in set(tokens):
+            if self._post(postings, token, pk) and not self._loading:
+                insort(self._vocab[kind], token)
+        if category_id is not None:
+            self._category_products[category_id].add(pk)
+
+    def _remove_doc(self, kind, pk):
+        doc = self._docs[kind].pop(pk, None)
+        if doc is None:
+            return
+        _, tokens, category_id = doc
+        self._name_length_total[kind] -= len(tokens)
+        postings = self._name_postings[kind]
+        for token in set(tokens):
+            if self._unpost(postings, token, pk):
+                vocab = self._vocab[kind]
+                i = bisect_left(vocab, token)
+                if i < len(vocab) and vocab[i] == token:
+                    del vocab[i]
+        if category_id is not None:
+            self._category_products[category_id].discard(pk)
+
+    def _add_category(self, pk, name, pet_category_id):
+        tokens = tokenize(name)
+        self._categories[pk] = (tokens, pet_category_id)
+        for token in set(tokens):
+            self._post(self._category_postings, token, pk)
+        self._pet_category_categories[pet_category_id].add(pk)
+
+    def _remove_category(self, pk):
+        entry = self._categories.pop(pk, None)
+        if entry is None:
+            return
+        tokens, pet_category_id = entry
+        for token in set(tokens):
+            self._unpost(self._category_postings, token, pk)
+        self._pet_category_categories[pet_category_id].discard(pk)
+
+    def _add_pet_category(self, pk, name):
+        tokens = tokenize(name)
+        self._pet_categories[pk] = tokens
+        for token in set(tokens):
+            self._post(self._pet_category_postings, token, pk)
+
+    def _remove_pet_category(self, pk):
+        for token in set(self._pet_categories.pop(pk, ())):
+            self._unpost(self._pet_category_postings, token, pk)
+
+    @_catalog_change
+    def update_doc(self, kind, pk, name, category_id=None):
+        self._remove_doc(kind, pk)
+        self._add_doc(kind, pk, name, category_id)
+
+    @_catalog_change
+    def remove_doc(self, kind, pk):
+        self._remove_doc(kind, pk)
+
+    @_catalog_change
+    def update_category(self, pk, name, pet_category_id):
+        self._remove_category(pk)
+        self._add_category(pk, name, pet_category_id)
+
+    @_catalog_change
+    def remove_category(self, pk):
+        self._remove_category(pk)
+        self._category_products.pop(pk, None)
+
+    @_catalog_change
+    def update_pet_category(self, pk, name):
+        self._remove_pet_category(pk)
+        self._add_pet_category(pk, name)
+
+    @_catalog_change
+    def remove_pet_category(self, pk):
+        self._remove_pet_category(pk)
+        self._pet_category_categories.pop(pk, None)
+
+    # --------------------------
+    # Lookups
+    # --------------------------
+    def _lookup(self, postings, term):
+        """Union of postings for the plural/singular variants of term."""
+        hits = set()
+        for variant in normalize_term(term):
+            if variant:
+                hits |= postings.get(variant, set())
+        return hits
+
+    def _pet_term_categories(self, term):
+        category_ids = set()
+        for pet_category_id in self._lookup(self._pet_category_postings, term):
+            category_ids |= self._pet_category_categories.get(pet_category_id, set())
+        return category_ids
+
+    def match_store(self, query):
+        """Return the pk of the store whose name equals, else contains, query."""
+        with self._lock:
+            stores = self._docs['store']
+            for pk, (name, _, _) in stores.items():
+                if name.lower() == query:
+                    return pk
+            for pk, (name, _, _) in stores.items():
+                if query in name.lower():
+                    return pk
+        return None
+
+    def _product_candidates(self, keywords):
+        """
+        Return (category_ids, extra_pks) describing the matching products:
+        every product of the categories plus extra_pks. Pet and category
+        keywords narrow the results, anything else matches item or
+        category names.
+        """
+        pet_categories = None
+        keyword_categories = None
+        for kw in keywords:
+            if kw in PET_KEYWORDS:
+                ids = self._pet_term_categories(kw)
+                pet_categories = ids if pet_categories is None else pet_categories | ids
+            if kw in CATEGORY_KEYWORDS:
+                ids = self._lookup(self._category_postings, kw)
+                keyword_categories = ids if keyword_categories is None else keyword_categories | ids
+
+        if pet_categories is not None and keyword_categories is not None:
+            return pet_categories & keyword_categories, set()
+        if pet_categories is not None:
+            return pet_categories, set()
+        if keyword_categories is not None:
+            return keyword_categories, set()
+
+        category_ids = set()
+        named = set()
+        postings = self._name_postings['product']
+        for kw in keywords:
+            category_ids |= self._lookup(self._category_postings, kw)
+            named |= self._lookup(postings, kw)
+        docs = self._docs['product']
+        return category_ids, {pk for pk in named if docs[pk][2] not in category_ids}
+
+    def _category_size(self, category_ids):
+        return sum(len(self._category_products.get(c, ())) for c in category_ids)
+
+    @staticmethod
+    def _bm25(tf, length, avg_length, idf):
+        norm = 1 - BM25_B + BM25_B * length / avg_length
+        return idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+
+    @staticmethod
+    def _idf(n, df):
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _name_scores(self, kind, keywords):
+        """Weighted BM25 score of the name field for docs matching a keyword."""
+        docs = self._docs[kind]
+        if not docs:
+            return {}
+        avg_length = self._name_length_total[kind] / len(docs) or 1
+        postings = self._name_postings[kind]
+        scores = defaultdict(float)
+        for kw in keywords:
+            pks = self._lookup(postings, kw)
+            if not pks:
+                continue
+            variants = set(normalize_term(kw))
+            idf = self._idf(len(docs), len(pks))
+            for pk in pks:
+                tokens = docs[pk][1]
+                tf = sum(1 for token in tokens if token in variants)
+                scores[pk] += NAME_WEIGHT * self._bm25(tf, len(tokens), avg_length, idf)
+        return scores
+
+    def _category_scores(self, keywords):
+        """
+        Weighted BM25 score of the category name field. Every product of a
+        category shares its score, so it is computed once per category.
+        """
+        n = len(self._docs['product'])
+        if not n or not self._categories:
+            return {}
+        avg_length = sum(len(tokens) for tokens, _ in self._categories.values()) / len(self._categories) or 1
+        scores = defaultdict(float)
+        for kw in keywords:
+            category_ids = self._lookup(self._category_postings, kw)
+            df = self._category_size(category_ids)
+            if not df:
+                continue
+            variants = set(normalize_term(kw))
+            idf = self._idf(n, df)
+            for category_id in category_ids:
+                tokens = self._categories[category_id][0]
+                tf = sum(1 for token in tokens if token in variants)
+                scores[category_id] += CATEGORY_WEIGHT * self._bm25(tf, len(tokens), avg_length, idf)
+        return scores
+
+    def count(self, kind, keywords):
+        """Number of docs of kind matching keywords, without ranking them."""
+        with self._lock:
+            if kind == 'product':
+                category_ids, extra = self._product_candidates(keywords)
+                return self._category_size(category_ids) + len(extra)
+            pks = set()
+            for kw in keywords:
+                pks |= self._lookup(self._name_postings[kind], kw)
+            return len(pks)
+
+    def search(self, kind, keywords, offset=0, limit=None):
+        """
+        Return (pks, total): the pks of kind matching keywords ordered by
+        BM25 relevance, sliced to [offset:offset + limit], and the number
+        of matches.
+        """
+        with self._lock:
+            name_scores = self._name_scores(kind, keywords)
+            if kind != 'product':
+                buckets = defaultdict(list)
+                for pk, score in name_scores.items():
+                    buckets[score].append((pk,))
+                return self._page(buckets, offset, limit), len(name_scores)
+
+            category_ids, extra = self._product_candidates(keywords)
+            total = self._category_size(category_ids) + len(extra)
+            category_scores = self._category_scores(keywords)
+            docs = self._docs['product']
+
+            # Products matched by name are scored one by one; the rest of a
+            # category shares the category score and forms a single bucket.
+            buckets = defaultdict(list)
+            named = set()
+            for pk, score in name_scores.items():
+                category_id = docs[pk][2]
+                if category_id in category_ids or pk in extra:
+                    buckets[score + category_scores.get(category_id, 0.0)].append((pk,))
+                    named.add(pk)
+            for category_id in category_ids:
+                pks = self._category_products.get(category_id)
+                if pks:
+                    buckets[category_scores.get(category_id, 0.0)].append(pks - named if named else pks)
+            return self._page(buckets, offset, limit), total
+
+    def prefix_search(self, kind, prefixes, limit):
+        """
+        Return up to limit (pk, name) pairs whose names contain a word
+        starting with any of the prefixes, best covered first. At most
+        PREFIX_CANDIDATES names are considered per prefix.
+        """
+        with self._lock:
+            vocab = self._vocab[kind]
+            postings = self._name_postings[kind]
+            scores = defaultdict(int)
+            for prefix in prefixes:
+                seen = set()
+                i = bisect_left(vocab, prefix)
+                while i < len(vocab) and vocab[i].startswith(prefix) and len(seen) < PREFIX_CANDIDATES:
+                    seen.update(postings[vocab[i]])
+                    i += 1
+                for pk in seen:
+                    scores[pk] += 1
+            buckets = defaultdict(list)
+            for pk, score in scores.items():
+                buckets[score].append((pk,))
+            docs = self._docs[kind]
+            return [(pk, docs[pk][0]) for pk in self._page(buckets, limit=limit)]
+
+    def correct(self, keywords):
+        """Return keywords with misspelled words corrected, or None."""
+        with self._lock:
+            return correct_keywords(self._trigrams, keywords)
+
+    def doc_name(self, kind, pk):
+        doc = self._docs[kind].get(pk)
+        return doc[0] if doc else None
+
+    @staticmethod
+    def _page(buckets, offset=0, limit=None):
+        """
+        Rank the pks in buckets ({score: [iterable of pks, ...]}) by score,
+        newest item first within the same score, and return the requested
+        slice. Only the best offset + limit pks are ever sorted.
+        """
+        end = None if limit is None else offset + limit
+        ranked = []
+        for score in sorted(buckets, reverse=True):
+            pks = itertools.chain.from_iterable(buckets[score])
+            if end is None:
+                ranked.extend(sorted(pks, reverse=True))
+                continue
+            ranked.extend(heapq.nlargest(end - len(ranked), pks))
+            if len(ranked) >= end:
+                break
+        return ranked[offset:end]
+
+
+search_index = SearchIndex()
@@ -0,0 +1,123 @@
+# core/shopper.py
+
+"""
+The shopper's cart and wishlist counts shown in the navbar, and the set of
+wishlisted items that listing pages mark their cards with.
+
+Both are read at most once per request and only when something uses them.
+The counts are the counters kept on the user or guest cart (see
+carts.counters); the wishlist set is cached per user under a version number
+that every change to the cart or wishlist bumps. The version lives in the
+cache backend, so the set is only fresh across worker processes when that
+backend is shared; SHOPPER_SUMMARY_TIMEOUT defaults to 0 (no caching)
+otherwise.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+
+from carts.models import Cart
+from shop.cartables import cartable_for_model
+from wishlist.models import WishlistItem
+
+EMPTY_SUMMARY = {'cart_count': 0, 'wishlist_count': 0}
+
+
+def _owner(request):
+    """Cache key part identifying the shopper, or None for a visitor with nothing to count."""
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    session_key = request.session.session_key
+    return f'cart:{session_key}' if session_key else None
+
+
+def _version_key(owner):
+    return f'shopper-summary-version:{owner}'
+
+
+def _version_timeout():
+    # A version must outlive every entry keyed by it: wishlist sets and cached carts
+    return max(settings.SHOPPER_SUMMARY_TIMEOUT, settings.CART_CACHE_TIMEOUT)
+
+
+def shopper_cache_key(request, prefix):
+    """
+    Cache key for data derived from the current shopper's cart or wishlist,
+    or None for a visitor with neither. It embeds the shopper's version, so
+    shopper_changed() retires every such key at once.
+    """
+    owner = _owner(request)
+    if owner is None:
+        return None
+    # A fresh version is unique, so an evicted version key cannot bring back old data
+    version = cache.get_or_set(_version_key(owner), time.time_ns, _version_timeout())
+    return f'{prefix}:{owner}:{version}'
+
+
+class ShopperSummary:
+    """Navbar counts and wishlist of the current shopper; nothing is read until used."""
+
+    def __init__(self, request):
+        self.request = request
+
+    @cached_property
+    def counts(self):
+        user = self.request.user
+        if user.is_authenticated:
+            # Loaded with the user for this request already
+            return {'cart_count': user.cart_count, 'wishlist_count': user.wishlist_count}
+        session_key = self.request.session.session_key
+        if not session_key:
+            return dict(EMPTY_SUMMARY)
+        cart_count = Cart.objects.filter(cart_id=session_key, user=None).values_list('item_count', flat=True).first()
+        return {'cart_count': cart_count or 0, 'wishlist_count': 0}
+
+    @cached_property
+    def wishlist(self):
+        """Set of (content_type_id, object_id) the signed-in shopper has wishlisted."""
+        if not self.request.user.is_authenticated:
+            return frozenset()
+        key = shopper_cache_key(self.request, 'wishlist') if settings.SHOPPER_SUMMARY_TIMEOUT else None
+        wishlist = cache.get(key) if key else None
+        if wishlist is None:
+            wishlist = frozenset(
+                WishlistItem.objects.filter(user=self.request.user).order_by().values_list('content_type_id', 'object_id')
+            )
+            if key:
+                cache.set(key, wishlist, settings.SHOPPER_SUMMARY_TIMEOUT)
+        return wishlist
+
+    def has_wishlisted(self, obj):
+        """Whether obj, a pet or product, is in the shopper's wishlist."""
+        cartable = cartable_for_model(type(obj))
+        return cartable is not None and (cartable.content_type_id, obj.pk) in self.wishlist
+
+    @property
+    def cart_count(self):
+        return self.counts['cart_count']
+
+    @property
+    def wishlist_count(self):
+        return self.counts['wishlist_count']
+
+
+def shopper_summary(request):
+    """The request's ShopperSummary, created on first use."""
+    if not hasattr(request, '_shopper_summary'):
+        request._shopper_summary = ShopperSummary(request)
+    return request._shopper_summary
+
+
+def shopper_changed(request):
+    """Invalidate the current shopper's summary; call after changing their cart or wishlist."""
+    request.__dict__.pop('_shopper_summary', None)
+    owner = _owner(request)
+    if owner is None:
+        return
+    try:
+        cache.incr(_version_key(owner))
+    except ValueError:
+        cache.set(_version_key(owner), time.time_ns(), _version_timeout())
@@ -0,0 +1,72 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from shop.models import Product, Pet, Store, ProductCategory, PetCategory
+from .search_backends import get_search_backend
+from .search_cache import search_cache
+
+
+# --------------------------
+# Keep the search backend in sync with the catalog
+# --------------------------
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    get_search_backend().update_doc('product', instance)
+
+
+@receiver(post_save, sender=Pet)
+def index_pet(sender, instance, **kwargs):
+    get_search_backend().update_doc('pet', instance)
+
+
+@receiver(post_save, sender=Store)
+def index_store(sender, instance, **kwargs):
+    get_search_backend().update_doc('store', instance)
+
+
+@receiver(post_save, sender=ProductCategory)
+def index_product_category(sender, instance, **kwargs):
+    get_search_backend().update_category(instance)
+
+
+@receiver(post_save, sender=PetCategory)
+def index_pet_category(sender, instance, **kwargs):
+    get_search_backend().update_pet_category(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().remove_doc('product', instance.pk)
+
+
+@receiver(post_delete, sender=Pet)
+def unindex_pet(sender, instance, **kwargs):
+    get_search_backend().remove_doc('pet', instance.pk)
+
+
+@receiver(post_delete, sender=Store)
+def unindex_store(sender, instance, **kwargs):
+    get_search_backend().remove_doc('store', instance.pk)
+
+
+@receiver(post_delete, sender=ProductCategory)
+def unindex_product_category(sender, instance, **kwargs):
+    get_search_backend().remove_category(instance.pk)
+
+
+@receiver(post_delete, sender=PetCategory)
+def unindex_pet_category(sender, instance, **kwargs):
+    get_search_backend().remove_pet_category(instance.pk)
+
+
+# --------------------------
+# Drop cached search results once the catalog changes (connected after
+# the receivers above, so the backend is already up to date)
+# --------------------------
+def clear_search_cache(sender, **kwargs):
+    search_cache.clear()
+
+
+for catalog_model in (Product, Pet, Store, ProductCategory, PetCategory):
+    post_save.connect(clear_search_cache, sender=catalog_model)
+    post_delete.connect(clear_search_cache, sender=catalog_model)
@@ -0,0 +1,20 @@
+"""Fixtures shared by the apps' test suites."""
+
+from django.contrib.auth import get_user_model
+
+from shop.models import Store
+
+
+def create_store(name='Paws'):
+    return Store.objects.create(name=name, address='1 Main St', city='Pune', contact_phone='123')
+
+
+def create_shopper(username='shopper'):
+    """An active account (password 'secret') that client.force_login() accepts."""
+    user = get_user_model().objects.create_user(
+        email=f'{username}@example.com', username=username, first_name='Sam', last_name='Shopper',
+        phone_number='9999999999', password='secret',
+    )
+    user.is_active = True
+    user.save(update_fields=['is_active'])
+    return user
@@ -1,3 +1,278 @@
-from django.test import TestCase
+import threading
+import time
 
-# Create your tests here.
+from django.core import signing
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from shop.models import PetCategory, Product, ProductCategory, Store
+from .models import CatalogGeneration
+from .pagination import CursorPaginator
+from .search_backends import SQLiteFTSSearchBackend, get_search_backend
+from .search_cache import SearchCache, query_key, search_cache
+from .search_index import search_index
+from .testing import create_store
+
+
+class SearchTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.store = create_store()
+        cls.dogs = PetCategory.objects.create(name='Dog')
+        cls.food = ProductCategory.objects.create(name='Dog Food', pet_category=cls.dogs)
+        cls.toys = ProductCategory.objects.create(name='Dog Toys', pet_category=cls.dogs)
+
+    def setUp(self):
+        # The index is per process and outlives each test's rolled back rows
+        search_index.build()
+        search_cache.clear()
+
+    def product(self, name, category=None):
+        return Product.objects.create(
+            name=name, category=category or self.toys, price=10, image='products/p.jpg', store=self.store,
+        )
+
+    def search(self, *keywords, kind='product'):
+        return search_index.search(kind, list(keywords))[0]
+
+
+class SearchIndexTests(SearchTestCase):
+
+    def test_build_loads_the_catalog(self):
+        ball = self.product('Rubber Ball')
+        search_index.build()
+        self.assertEqual(self.search('ball'), [ball.pk])
+        self.assertEqual(self.search('balls'), [ball.pk])
+        self.assertEqual(self.search('paws', kind='store'), [self.store.pk])
+
+    def test_saves_and_deletes_update_the_index(self):
+        ball = self.product('Rubber Ball')
+        self.assertEqual(self.search('ball'), [ball.pk])
+
+        ball.name = 'Rope Tug'
+        ball.save()
+        self.assertEqual(self.search('ball'), [])
+        self.assertEqual(self.search('rope'), [ball.pk])
+
+        ball.delete()
+        self.assertEqual(self.search('rope'), [])
+
+    @override_settings(SEARCH_INDEX_CHECK_INTERVAL=0)
+    def test_own_changes_do_not_rebuild_the_index(self):
+        self.product('Rubber Ball')
+        # Only the shared generation is read
+        with self.assertNumQueries(1):
+            search_index.ensure_built()
+
+    @override_settings(SEARCH_INDEX_CHECK_INTERVAL=0)
+    def test_changes_made_by_other_processes_rebuild_the_index(self):
+        ball = self.product('Rubber Ball')
+        # As another worker would: the rows change, then the generation
+        Product.objects.filter(pk=ball.pk).update(name='Rope Tug')
+        CatalogGeneration.bump()
+
+        search_index.ensure_built()
+        self.assertEqual(self.search('rope'), [ball.pk])
+        self.assertEqual(self.search('ball'), [])
+
+
+class AutocompleteTests(SearchTestCase):
+
+    def suggest(self, term):
+        response = self.client.get(reverse('core:autocomplete_search'), {'term': term})
+        return [suggestion['label'] for suggestion in response.json()]
+
+    def test_names_are_completed_from_a_typed_prefix(self):
+        self.product('Rubber Ball')
+        self.product('Rope Tug')
+        self.assertEqual(self.suggest('rub'), ['Product: Rubber Ball'])
+        self.assertEqual(self.suggest('ro'), ['Product: Rope Tug'])
+        self.assertEqual(self.suggest('pa'), ['Store: Paws'])
+
+    def test_a_partial_filter_keyword_lists_its_products(self):
+        kibble = self.product('Kibble', category=self.food)
+        self.product('Rubber Ball')
+        self.assertEqual(self.suggest('foo'), [f'Product: {kibble.name}'])
+
+    def test_autocomplete_does_not_query_the_database(self):
+        self.product('Rubber Ball')
+        with self.assertNumQueries(0):
+            self.assertEqual(search_index.prefix_search('product', ['rub'], 5)[0][1], 'Rubber Ball')
+
+
+@override_settings(SEARCH_BACKEND='core.search_backends.SQLiteFTSSearchBackend')
+class SQLiteFTSBackendTests(SearchTestCase):
+
+    def setUp(self):
+        super().setUp()
+        get_search_backend.cache_clear()
+        self.addCleanup(get_search_backend.cache_clear)
+        self.backend = get_search_backend()
+
+    def test_configured_backend_is_kept_in_sync(self):
+        self.assertIsInstance(self.backend, SQLiteFTSSearchBackend)
+        ball = self.product('Rubber Ball')
+        self.assertEqual(self.backend.search('product', ['balls']), [ball.pk])
+        self.assertEqual(self.backend.prefix_search('product', ['rub'], 5), [(ball.pk, 'Rubber Ball')])
+
+        ball.delete()
+        self.assertEqual(self.backend.count('product', ['ball']), 0)
+
+    def test_rebuild_and_filter_keywords(self):
+        kibble = self.product('Kibble', category=self.food)
+        self.product('Rubber Ball')
+        self.assertEqual(self.backend.rebuild(), {'product': 2, 'pet': 0, 'store': 1})
+        self.assertEqual(self.backend.search('product', ['dog', 'food']), [kibble.pk])
+
+
+class SearchRankingTests(SearchTestCase):
+
+    def test_name_matches_rank_first_and_shorter_names_higher(self):
+        ball = self.product('Rubber Ball')
+        plush = self.product('Big Plush Toy Bone')
+        squeaky = self.product('Squeaky Toy')
+        self.assertEqual(self.search('toy'), [squeaky.pk, plush.pk, ball.pk])
+        self.assertEqual(search_index.search('product', ['toy'], offset=1, limit=1), ([plush.pk], 3))
+
+    def test_results_page_is_ranked_and_paginated(self):
+        self.product('Squeaky Toy')
+        self.product('Rubber Ball')
+        response = self.client.get(reverse('core:site_search'), {'q': 'toy'})
+        products = response.context['products']
+        self.assertEqual(products.paginator.count, 2)
+        self.assertEqual([product.name for product in products], ['Squeaky Toy', 'Rubber Ball'])
+
+
+class TypoCorrectionTests(SearchTestCase):
+
+    def test_misspelled_words_are_corrected(self):
+        self.product('Golden Retriever Collar')
+        self.assertEqual(search_index.correct(['retreiver']), ['retriever'])
+        self.assertEqual(search_index.correct(['collar']), None)
+
+    def test_search_and_autocomplete_fall_back_to_the_correction(self):
+        collar = self.product('Golden Retriever Collar')
+        response = self.client.get(reverse('core:site_search'), {'q': 'retreiver'})
+        self.assertEqual(response.context['corrected_query'], 'retriever')
+        self.assertEqual(list(response.context['products']), [collar])
+
+        response = self.client.get(reverse('core:autocomplete_search'), {'term': 'retreiver'})
+        self.assertEqual([s['label'] for s in response.json()], ['Product: Golden Retriever Collar'])
+
+
+class Interrupted(BaseException):
+    pass
+
+
+class SearchCacheTests(SimpleTestCase):
+
+    def test_an_interrupted_computation_does_not_block_later_callers(self):
+        cache = SearchCache()
+        started, release = threading.Event(), threading.Event()
+        results = []
+
+        def interrupted():
+            started.set()
+            release.wait()
+            raise Interrupted
+
+        def leader():
+            try:
+                cache.get_or_compute('key', interrupted)
+            except Interrupted:
+                results.append('interrupted')
+
+        def waiter():
+            results.append(cache.get_or_compute('key', lambda: 'fresh'))
+
+        threads = [threading.Thread(target=leader), threading.Thread(target=waiter)]
+        threads[0].start()
+        started.wait()
+        threads[1].start()
+        time.sleep(0.05)  # let the waiter join the flight
+        release.set()
+        for thread in threads:
+            thread.join(timeout=5)
+            self.assertFalse(thread.is_alive())
+
+        self.assertCountEqual(results, ['interrupted', 'fresh'])
+        self.assertEqual(cache._inflight, {})
+        self.assertEqual(cache.get_or_compute('key', lambda: 'other'), 'fresh')
+
+    def test_query_key_ignores_word_order_and_plurals(self):
+        self.assertEqual(query_key(['rubber', 'balls']), query_key(['ball', 'rubber']))
+        # Filter keywords are matched exactly
+        self.assertNotEqual(query_key(['medicine']), query_key(['medicines']))
+
+    def test_entries_expire_and_the_oldest_are_evicted(self):
+        cache = SearchCache(max_entries=2, timeout=60)
+        for key in 'abc':
+            cache.get_or_compute(key, lambda key=key: key.upper())
+        self.assertEqual(list(cache._entries), ['b', 'c'])
+
+        uncached = SearchCache(timeout=0)
+        uncached.get_or_compute('a', lambda: 'A')
+        self.assertEqual(uncached.get_or_compute('a', lambda: 'fresh'), 'fresh')
+
+    def test_results_computed_across_a_clear_are_not_kept(self):
+        cache = SearchCache()
+
+        def compute():
+            cache.clear()  # as a catalog change during the search would
+            return 'stale'
+
+        self.assertEqual(cache.get_or_compute('key', compute), 'stale')
+        self.assertEqual(cache.get_or_compute('key', lambda: 'fresh'), 'fresh')
+
+
+class SearchCacheInvalidationTests(SearchTestCase):
+
+    def test_catalog_changes_clear_the_search_cache(self):
+        ball = self.product('Rubber Ball')
+        search_cache.get_or_compute('key', lambda: 'stale')
+        ball.save()
+        self.assertEqual(search_cache.get_or_compute('key', lambda: 'fresh'), 'fresh')
+
+
+class CursorPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Repeated names, so pages must break ties on the id
+        Store.objects.bulk_create(
+            Store(name=name, address='1 Main St', city='Pune', contact_phone='123')
+            for name in ['Bark', 'Paws', 'Bark', 'Tails', 'Paws', 'Bark', 'Mews']
+        )
+        cls.ordered = list(Store.objects.order_by('name', 'id'))
+
+    def setUp(self):
+        self.paginator = CursorPaginator(Store.objects.all(), ['name'], 3)
+
+    def test_next_and_previous_cursors_round_trip(self):
+        pages = [self.paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([store for page in pages for store in page], self.ordered)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertFalse(pages[0].has_previous())
+
+        back = self.paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual(list(back), list(pages[1]))
+        self.assertTrue(back.has_next())
+        back = self.paginator.get_page(back.previous_cursor)
+        self.assertEqual(list(back), list(pages[0]))
+        self.assertFalse(back.has_previous())
+
+    def test_invalid_cursors_give_the_first_page(self):
+        for cursor in ['garbage', signing.dumps([['Bark'], False], salt='other')]:
+            self.assertEqual(list(self.paginator.get_page(cursor)), self.ordered[:3])
+
+    def test_page_links_keep_the_other_parameters(self):
+        response = self.client.get(reverse('shop:all_pet_shops'), {'sort': 'name'})
+        stores = response.context['stores']
+        self.assertEqual(list(stores), self.ordered[:6])
+        params = QueryDict(stores.next_query)
+        self.assertEqual(params['sort'], 'name')
+        self.assertEqual(list(self.client.get(reverse('shop:all_pet_shops'), params).context['stores']), self.ordered[6:])
@@ -0,0 +1,22 @@
+# core/utils.py
+
+import re
+
+# Known filter keywords used by site search and autocomplete
+PET_KEYWORDS = ['dog', 'cat', 'bird', 'fish', 'rabbit']
+CATEGORY_KEYWORDS = ['accessories', 'food', 'medicine', 'medicines', 'cage', 'toy']
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize_term(term):
+    """Return basic plural/singular variations."""
+    if term.endswith('s'):
+        return [term[:-1], term]
+    else:
+        return [term, term + 's']
+
+
+def tokenize(text):
+    """Split text into lowercase alphanumeric tokens."""
+    return TOKEN_RE.findall((text or '').lower())
@@ -1,18 +1,56 @@
 from django.shortcuts import render, redirect
-from django.db.models import Q
 from django.http import JsonResponse
+from django.core.paginator import Paginator
 from shop.models import Product, Pet, Store  # Import models from shop
-
-
-# --------------------------
-# Utility: plural/singular handling
-# --------------------------
-def normalize_term(term):
-    """Return basic plural/singular variations."""
-    if term.endswith('s'):
-        return [term[:-1], term]
-    else:
-        return [term, term + 's']
+from .autocomplete import suggest
+from .search_backends import get_search_backend
+from .search_cache import search_cache, query_key
+from .shopper import shopper_summary
+
+
+def fetch_in_order(model, pks):
+    """Load model instances for pks in one query, keeping the pk order."""
+    objects = model.objects.in_bulk(pks)
+    return [objects[pk] for pk in pks if pk in objects]
+
+
+class SearchResults:
+    """
+    Lazy, Paginator-compatible view of one kind of search hits: count()
+    asks the backend for the number of matches and slicing searches and
+    loads only the requested page. Backend answers go through the search
+    cache, keyed by the normalized query.
+    """
+
+    def __init__(self, backend, kind, model, keywords):
+        self.backend = backend
+        self.kind = kind
+        self.model = model
+        self.keywords = keywords
+        self.key = query_key(keywords)
+
+    def count(self):
+        return search_cache.get_or_compute(
+            ('count', self.kind, self.key),
+            lambda: self.backend.count(self.kind, self.keywords),
+        )
+
+    def __getitem__(self, index):
+        start = index.start or 0
+        limit = index.stop - start
+        pks = search_cache.get_or_compute(
+            ('search', self.kind, self.key, start, limit),
+            lambda: self.backend.search(self.kind, self.keywords, offset=start, limit=limit),
+        )
+        return fetch_in_order(self.model, pks)
+
+
+# Results shown per section of the search results page
+SEARCH_PAGE_SIZES = {
+    'products': 12,
+    'pets': 8,
+    'stores': 10,
+}
 
 
 # --------------------------
@@ -28,61 +66,45 @@ def site_search(request):
     if query in ['pet store', 'store', 'stores']:
         return redirect('shop:store')  # store landing page
 
+    backend = get_search_backend()
+
     # --- Redirect for exact / partial store name ---
-    matching_store = Store.objects.filter(name__iexact=query).first()
-    if not matching_store:
-        matching_store = Store.objects.filter(name__icontains=query).first()
+    matching_store = None
+    if query:
+        matching_store = search_cache.get_or_compute(('store', query), lambda: backend.match_store(query))
     if matching_store:
-        return redirect('shop:store_detail', pk=matching_store.pk)
-
-    # --- Known filter keywords ---
-    pet_keywords = ['dog', 'cat', 'bird', 'fish', 'rabbit']
-    category_keywords = ['accessories', 'food', 'medicine', 'medicines', 'cage', 'toy']
-
-    pet_filter = None
-    category_filter = None
-
-    for kw in keywords:
-        if kw in pet_keywords:
-            pf = Q(category__pet_category__name__icontains=kw)
-            pet_filter = pf if pet_filter is None else pet_filter | pf
-        if kw in category_keywords:
-            cf = Q(category__name__icontains=kw)
-            category_filter = cf if category_filter is None else category_filter | cf
-
-    # --- Product filtering logic ---
-    if pet_filter and category_filter:
-        product_filter = pet_filter & category_filter
-    elif pet_filter:
-        product_filter = pet_filter
-    elif category_filter:
-        product_filter = category_filter
-    else:
-        # Fallback: search by each term (partial support)
-        product_filter = Q()
-        for t in keywords:
-            product_filter |= Q(name__icontains=t) | Q(category__name__icontains=t)
-
-    products = Product.objects.filter(product_filter).distinct()
-
-    # --- Pets search ---
-    pet_name_filter = Q()
-    for t in keywords:
-        pet_name_filter |= Q(name__icontains=t)
-    pets = Pet.objects.filter(pet_name_filter).distinct()
-
-    # --- Stores search ---
-    store_name_filter = Q()
-    for t in keywords:
-        store_name_filter |= Q(name__icontains=t)
-    stores = Store.objects.filter(store_name_filter).distinct()
-
-    return render(request, 'core/site_search_results.html', {
-        'query': query,
-        'products': products,
-        'pets': pets,
-        'stores': stores
-    })
+        return redirect('shop:store_detail', pk=matching_store)
+
+    # --- Ranked, paginated hits from the search backend ---
+    context = {'query': query}
+    context.update(search_sections(request, backend, keywords))
+
+    # --- Typo fallback: retry with the closest known words ---
+    if keywords and not any(context[section].paginator.count for section in SEARCH_PAGE_SIZES):
+        corrected = search_cache.get_or_compute(
+            ('correct', tuple(keywords)), lambda: backend.correct(keywords)
+        )
+        if corrected:
+            context.update(search_sections(request, backend, corrected))
+            context['corrected_query'] = ' '.join(corrected)
+
+    return render(request, 'core/site_search_results.html', context)
+
+
+def search_sections(request, backend, keywords):
+    """Paginated products, pets and stores matching keywords."""
+    context = {}
+    sections = {'products': ('product', Product), 'pets': ('pet', Pet), 'stores': ('store', Store)}
+    for section, (kind, model) in sections.items():
+        results = SearchResults(backend, kind, model, keywords)
+        paginator = Paginator(results, SEARCH_PAGE_SIZES[section])
+        context[section] = paginator.get_page(request.GET.get(f'{section}_page'))
+
+        # Query string for this section's page links, without its own page
+        params = request.GET.copy()
+        params.pop(f'{section}_page', None)
+        context[f'{section}_query'] = params.urlencode()
+    return context
 
 
 # --------------------------
@@ -90,56 +112,10 @@ def site_search(request):
 # --------------------------
 def autocomplete_search(request):
     term = request.GET.get('term', '').strip().lower()
-    results = []
-
-    if term:
-        keywords = term.split()
-
-        pet_keywords = ['dog', 'cat', 'bird', 'fish', 'rabbit']
-        category_keywords = ['accessories', 'food', 'medicine', 'medicines', 'cage', 'toy']
-
-        pet_filter = None
-        category_filter = None
-
-        for kw in keywords:
-            if kw in pet_keywords:
-                pf = Q(category__pet_category__name__icontains=kw)
-                pet_filter = pf if pet_filter is None else pet_filter | pf
-            if kw in category_keywords:
-                cf = Q(category__name__icontains=kw)
-                category_filter = cf if category_filter is None else category_filter | cf
-
-        if pet_filter and category_filter:
-            product_filter = pet_filter & category_filter
-        elif pet_filter:
-            product_filter = pet_filter
-        elif category_filter:
-            product_filter = category_filter
-        else:
-            # Partial match fallback on each keyword
-            product_filter = Q()
-            for t in keywords:
-                product_filter |= Q(name__icontains=t) | Q(category__name__icontains=t)
-
-        # --- Products autocomplete ---
-        products = Product.objects.filter(product_filter).distinct()[:5]
-        for p in products:
-            results.append({'label': f'Product: {p.name}', 'url': p.get_absolute_url()})
-
-        # --- Pets autocomplete ---
-        pet_name_filter = Q()
-        for t in keywords:
-            pet_name_filter |= Q(name__icontains=t)
-        pets = Pet.objects.filter(pet_name_filter).distinct()[:3]
-        for pet in pets:
-            results.append({'label': f'Pet: {pet.name}', 'url': pet.get_absolute_url()})
-
-        # --- Stores autocomplete ---
-        store_name_filter = Q()
-        for t in keywords:
-            store_name_filter |= Q(name__icontains=t)
-        stores = Store.objects.filter(store_name_filter).distinct()[:3]
-        for store in stores:
-            results.append({'label': f'Store: {store.name}', 'url': f"/store/{store.pk}/"})
-
+    results = suggest(term) if term else []
     return JsonResponse(results, safe=False)
+
+
+def shopper_summary_api(request):
+    """Cart and wishlist counts for the navbar badges, in one request."""
+    return JsonResponse(shopper_summary(request).counts)
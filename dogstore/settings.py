@@ -75,8 +75,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
-                'wishlist.context_processors.wishlist_item_count',
-                'carts.context_processors.cart_item_count',
+                'core.context_processors.shopper',
             ],
         },
     },
@@ -117,6 +116,44 @@ DATABASES = {
     #     'PORT': env('DB_PORT', default='5432'),
     # }
 
+# Cache backend, e.g. CACHE_URL=rediscache://127.0.0.1:6379/1, or
+# dbcache://django_cache after `python manage.py createcachetable`. The
+# default keeps a separate cache in every worker process, so caches that
+# other processes must be able to invalidate stay off unless it is shared.
+CACHES = {'default': env.cache('CACHE_URL', default='locmemcache://')}
+SHARED_CACHE = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Site search backend:
+#   core.search_backends.MemorySearchBackend    - in-process index (default)
+#   core.search_backends.SQLiteFTSSearchBackend - SQLite FTS5 table
+#   core.search_backends.PostgresSearchBackend  - PostgreSQL tsvector + GIN index
+# Run `python manage.py rebuild_search_index` after switching backends.
+SEARCH_BACKEND = env('SEARCH_BACKEND', default='core.search_backends.MemorySearchBackend')
+
+# Seconds between checks of the in-memory index against the shared catalog
+# generation; catalog changes made by other processes show up within it.
+SEARCH_INDEX_CHECK_INTERVAL = env.int('SEARCH_INDEX_CHECK_INTERVAL', default=5)
+
+# Per-process cache of search results: max entries and seconds to keep them
+# (0 disables). Changes made by other processes show up once entries expire.
+SEARCH_CACHE_SIZE = env.int('SEARCH_CACHE_SIZE', default=1024)
+SEARCH_CACHE_TIMEOUT = env.int('SEARCH_CACHE_TIMEOUT', default=60)
+
+# Seconds to cache a shopper's wishlist set (core.shopper); 0 reads it from
+# the database every time. Changes made through the site invalidate it at
+# once in every process sharing the cache, admin edits once it expires; off
+# by default without a shared cache, where other workers would not see them.
+SHOPPER_SUMMARY_TIMEOUT = env.int('SHOPPER_SUMMARY_TIMEOUT', default=300 if SHARED_CACHE else 0)
+
+# Seconds to cache each shopper's cart (lines, prices and totals) in the
+# cache backend for the cart page; 0 reads it from the database every time.
+# Off by default without a shared cache, where cart and price changes made
+# in one worker could not retire the carts cached by the others.
+CART_CACHE_TIMEOUT = env.int('CART_CACHE_TIMEOUT', default=300 if SHARED_CACHE else 0)
+
 
 
 
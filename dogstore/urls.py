@@ -18,6 +18,7 @@ from django.urls import path, include
 from . import views
 from django.conf import settings
 from django.conf.urls.static import static
+from core.views import shopper_summary_api
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -28,6 +29,7 @@ urlpatterns = [
     path('wishlist/', include('wishlist.urls', namespace='wishlist')),
     path('search/', include('core.urls', namespace='core')),
     path('services/', include('services.urls', namespace='services')),
+    path('shopper/summary/', shopper_summary_api, name='shopper_summary'),
 ]
 
 if settings.DEBUG:
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dogstore.settings')
 
 application = get_wsgi_application()
+
+# Build the in-memory search/autocomplete index before serving requests
+from django.db import DatabaseError  # noqa: E402
+from core.search_backends import get_search_backend  # noqa: E402
+
+try:
+    get_search_backend().warm()
+except DatabaseError:
+    pass  # Tables not migrated yet; the index is built on first search instead
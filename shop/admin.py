@@ -1,4 +1,4 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
 from .models import Pet, PetCategory, Store, ProductCategory, Product, PetReview, Favourite,Order
 
@@ -7,6 +7,29 @@ admin.site.register(PetCategory)
 admin.site.register(Store)
 admin.site.register(ProductCategory)
 admin.site.register(Product)
-admin.site.register(PetReview)
 admin.site.register(Favourite)
-admin.site.register(Order)
\ No newline at end of file
+admin.site.register(Order)
+
+
+# --------------------------
+# Review moderation queue
+# --------------------------
+@admin.register(PetReview)
+class PetReviewAdmin(admin.ModelAdmin):
+    list_display = ('pet', 'user', 'rating', 'approved', 'created_at')
+    list_filter = ('approved', 'rating', 'created_at', ('pet', admin.RelatedOnlyFieldListFilter))
+    list_select_related = ('pet__category', 'user')
+    ordering = ('approved', 'created_at')
+    raw_id_fields = ('pet', 'user')
+    search_fields = ('comment',)
+    actions = ('approve_reviews', 'reject_reviews')
+
+    @admin.action(description="Approve selected reviews", permissions=['change'])
+    def approve_reviews(self, request, queryset):
+        approved = queryset.approve()
+        self.message_user(request, f"Approved {approved} review{'s' if approved != 1 else ''}.", messages.SUCCESS)
+
+    @admin.action(description="Reject (delete) selected reviews", permissions=['delete'])
+    def reject_reviews(self, request, queryset):
+        rejected = queryset.reject()
+        self.message_user(request, f"Rejected {rejected} review{'s' if rejected != 1 else ''}.", messages.SUCCESS)
@@ -0,0 +1,61 @@
+# shop/cartables.py
+
+"""
+Registry of the catalog models that can go in carts and wishlists, under
+the short names the pages post ("pet", "product"). Carts, wishlists and
+checkout resolve names, content types and objects through it.
+"""
+
+from django.contrib.contenttypes.models import ContentType
+from django.utils.functional import cached_property
+
+from .models import Pet, Product
+
+
+class Cartable:
+    """A model that can be put in carts and wishlists."""
+
+    price_field = 'price'
+    name_field = 'name'
+
+    def __init__(self, name, model):
+        self.name = name
+        self.model = model
+
+    def __repr__(self):
+        return f'<Cartable {self.name}>'
+
+    @cached_property
+    def content_type(self):
+        # Looked up on first use, then kept for the life of the process
+        return ContentType.objects.get_for_model(self.model)
+
+    @property
+    def content_type_id(self):
+        return self.content_type.pk
+
+    def existing_ids(self, object_ids):
+        """The subset of object_ids that exist, with one query."""
+        return set(self.model.objects.filter(pk__in=object_ids).values_list('pk', flat=True))
+
+    def price(self, obj):
+        return getattr(obj, self.price_field)
+
+    def label(self, obj):
+        return getattr(obj, self.name_field)
+
+
+CARTABLES = {cartable.name: cartable for cartable in (Cartable('pet', Pet), Cartable('product', Product))}
+
+
+def get_cartable(name):
+    """The Cartable registered as name, or None."""
+    return CARTABLES.get(name.lower()) if isinstance(name, str) else None
+
+
+def cartable_for_model(model):
+    """The Cartable for model, or None."""
+    for cartable in CARTABLES.values():
+        if cartable.model is model:
+            return cartable
+    return None
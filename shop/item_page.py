@@ -0,0 +1,85 @@
+# shop/item_page.py
+
+"""
+Context for the pet and product detail pages, built with a fixed number of
+queries however large the catalog, the reviews or the shopper's cart get.
+"""
+
+from django.db.models import Exists, OuterRef, Value
+from django.shortcuts import get_object_or_404
+
+from carts.models import CartItem
+from core.pagination import CursorPaginator
+from wishlist.models import WishlistItem
+from .cartables import cartable_for_model
+from .models import Pet, PetReview, Product
+
+# Items shown in the bounded sections of the pet page
+RELATED_PRODUCTS_LIMIT = 12
+REVIEWS_LIMIT = 10  # per page; more are loaded with shop:pet_reviews
+# Newest first; the id breaks ties between reviews posted together
+REVIEW_ORDERING = ['-created_at', '-id']
+
+
+def with_shopper_flags(queryset, request):
+    """
+    Annotate the items of queryset with is_in_wishlist and in_cart for the
+    current shopper, so both flags come back with the item itself. Matches
+    the cart page: a signed-in user's items, else the session cart's.
+    """
+    same_item = {'content_type_id': cartable_for_model(queryset.model).content_type_id, 'object_id': OuterRef('pk')}
+
+    if request.user.is_authenticated:
+        is_in_wishlist = Exists(WishlistItem.objects.filter(user=request.user, **same_item))
+        in_cart = Exists(CartItem.objects.filter(user=request.user, active=True, **same_item))
+    else:
+        is_in_wishlist = Value(False)
+        # Without a session there is no guest cart to look in
+        session_key = request.session.session_key
+        if session_key:
+            in_cart = Exists(CartItem.objects.filter(cart__cart_id=session_key, active=True, **same_item))
+        else:
+            in_cart = Value(False)
+
+    return queryset.annotate(is_in_wishlist=is_in_wishlist, in_cart=in_cart)
+
+
+def review_page(pet_id, cursor=None, strict=False):
+    """
+    A CursorPage of the approved reviews of pet_id, with their authors.
+    Raises InvalidCursor for a bad cursor when strict, else gives the first page.
+    """
+    reviews = PetReview.objects.filter(pet_id=pet_id, approved=True).select_related('user')
+    return CursorPaginator(reviews, REVIEW_ORDERING, REVIEWS_LIMIT).get_page(cursor, strict=strict)
+
+
+def pet_page_context(request, pk):
+    """Pet (with category, store and shopper flags), related products and the first page of reviews."""
+    pet = get_object_or_404(
+        with_shopper_flags(Pet.objects.select_related('category', 'store'), request), pk=pk
+    )
+    related_products = (
+        Product.objects.filter(category__pet_category=pet.category_id)
+        .order_by('-id')[:RELATED_PRODUCTS_LIMIT]
+    )
+    return {
+        'pet': pet,
+        'related_products': related_products,
+        'reviews': review_page(pet.pk),
+        'average_rating': pet.average_rating,
+        'review_count': pet.review_count,
+        'is_in_wishlist': pet.is_in_wishlist,
+        'in_cart': pet.in_cart,
+    }
+
+
+def product_page_context(request, pk):
+    """Product (with category, store and shopper flags)."""
+    product = get_object_or_404(
+        with_shopper_flags(Product.objects.select_related('category', 'store'), request), pk=pk
+    )
+    return {
+        'product': product,
+        'in_cart': product.in_cart,                  # For Add to Cart button state
+        'is_in_wishlist': product.is_in_wishlist,    # For Wishlist heart state
+    }
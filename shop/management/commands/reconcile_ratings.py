@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from shop.models import Pet
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the rating of every pet from its approved reviews with one "
+        "grouped query and fix the ones that drifted. Approving, editing and "
+        "deleting reviews keep ratings current; run this after bulk edits or raw SQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Pets read and written per query (default 500).",
+        )
+
+    def handle(self, *args, batch_size, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            fixed = Pet.reconcile_ratings(batch_size=batch_size)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Fixed the ratings of {fixed} pets in {elapsed:.2f}s"
+        ))
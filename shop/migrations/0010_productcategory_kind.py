@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:27
+
+from django.db import migrations, models
+
+# Frozen copy of shop.models.CATEGORY_KIND_KEYWORDS
+CATEGORY_KIND_KEYWORDS = [
+    ('accessories', ['accessor']),
+    ('medicine', ['medicine']),
+    ('food', ['food']),
+    ('cage', ['cage']),
+    ('aquarium', ['aquarium', 'tank']),
+    ('toys', ['toy']),
+]
+
+
+def set_category_kinds(apps, schema_editor):
+    ProductCategory = apps.get_model('shop', 'ProductCategory')
+    pks_by_kind = {}
+    for pk, name in ProductCategory.objects.values_list('pk', 'name'):
+        lowered = name.lower()
+        kind = 'other'
+        for candidate, fragments in CATEGORY_KIND_KEYWORDS:
+            if any(fragment in lowered for fragment in fragments):
+                kind = candidate
+                break
+        pks_by_kind.setdefault(kind, []).append(pk)
+    for kind, pks in pks_by_kind.items():
+        ProductCategory.objects.filter(pk__in=pks).update(kind=kind)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_order_payment_status_order_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcategory',
+            name='kind',
+            field=models.CharField(blank=True, choices=[('accessories', 'Accessories'), ('toys', 'Toys'), ('medicine', 'Medicine'), ('food', 'Food'), ('cage', 'Cage'), ('aquarium', 'Aquarium / Tank'), ('other', 'Other')], help_text='Taxonomy used by the listing pages; guessed from the name when left blank', max_length=20),
+        ),
+        migrations.RunPython(set_category_kinds, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='productcategory',
+            index=models.Index(fields=['kind', 'pet_category'], name='product_category_kind_pet_idx'),
+        ),
+    ]
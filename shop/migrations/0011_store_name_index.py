@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_productcategory_kind'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='store',
+            index=models.Index(fields=['name', 'id'], name='shop_store_name_id_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_category_products(apps, schema_editor):
+    ProductCategory = apps.get_model('shop', 'ProductCategory')
+    Product = apps.get_model('shop', 'Product')
+    CategoryFacet = apps.get_model('shop', 'CategoryFacet')
+    counts = dict(
+        Product.objects.values('category_id').annotate(n=Count('id')).values_list('category_id', 'n')
+    )
+    CategoryFacet.objects.bulk_create(
+        CategoryFacet(category_id=pk, product_count=counts.get(pk, 0))
+        for pk in ProductCategory.objects.values_list('pk', flat=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_store_name_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryFacet',
+            fields=[
+                ('category', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='facet', serialize=False, to='shop.productcategory')),
+                ('product_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'product_category_facet',
+            },
+        ),
+        migrations.RunPython(count_category_products, migrations.RunPython.noop),
+    ]
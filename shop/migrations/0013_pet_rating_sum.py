@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:50
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_ratings(apps, schema_editor):
+    Pet = apps.get_model('shop', 'Pet')
+    PetReview = apps.get_model('shop', 'PetReview')
+    totals = (
+        PetReview.objects.filter(approved=True).order_by()
+        .values('pet_id').annotate(total=Sum('rating'), count=Count('id'))
+        .values_list('pet_id', 'total', 'count')
+    )
+    Pet.objects.update(rating_sum=0, review_count=0, average_rating=0.0)
+    Pet.objects.bulk_update(
+        [Pet(pk=pet_id, rating_sum=total, review_count=count, average_rating=total / count)
+         for pet_id, total, count in totals],
+        ['rating_sum', 'review_count', 'average_rating'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_categoryfacet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pet',
+            name='rating_sum',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_pet_rating_sum'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='petreview',
+            index=models.Index(fields=['approved', 'created_at'], name='shop_review_approved_idx'),
+        ),
+    ]
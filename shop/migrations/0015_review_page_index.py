@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_review_moderation_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='petreview',
+            index=models.Index(fields=['pet', 'approved', '-created_at', '-id'], name='shop_review_pet_page_idx'),
+        ),
+    ]
@@ -1,6 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
-from django.db.models import Avg, Count
+from django.db.models import Count, F, FloatField, PositiveBigIntegerField, Q, Sum, Value
+from django.db.models.functions import Cast, Greatest
 from django.utils.text import slugify
 from django.urls import reverse
 
@@ -11,6 +12,12 @@ class Store(models.Model):
     city = models.CharField(max_length=50)
     contact_phone = models.CharField(max_length=20)
 
+    class Meta:
+        indexes = [
+            # Alphabetical store listing, paged by (name, id)
+            models.Index(fields=['name', 'id'], name='shop_store_name_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
     
@@ -36,6 +43,8 @@ class Pet(models.Model):
     description = models.TextField(blank=True)
     average_rating = models.FloatField(default=0.0)
     review_count = models.PositiveBigIntegerField(default=0)
+    # Sum of the approved reviews' stars; average_rating is rating_sum / review_count
+    rating_sum = models.PositiveBigIntegerField(default=0, editable=False)
 
     def get_absolute_url(self):
         return reverse('shop:pet_detail', args=[self.pk])
@@ -45,29 +54,146 @@ class Pet(models.Model):
         return f"{self.name}{breed_text} ({self.category})"
     
     def update_rating(self):
+        """Recount this pet's rating from its approved reviews, writing only the rating columns."""
         agg = self.reviews.filter(approved=True).aggregate(
-            avg = Avg('rating'),
+            total = Sum('rating'),
             count = Count('id')
         )
-        self.average_rating = agg['avg'] if agg['avg'] else 0.0
-        self.review_count = agg['count'] if agg['count'] else 0
-        self.save()
+        self.rating_sum = agg['total'] or 0
+        self.review_count = agg['count']
+        self.average_rating = _average(self.rating_sum, self.review_count)
+        self.save(update_fields=RATING_FIELDS)
+
+    @classmethod
+    def adjust_rating(cls, pet_id, rating_delta, count_delta):
+        """
+        Add a change in approved reviews (stars and number of reviews) to the
+        stored rating of pet_id, in one UPDATE of the rating columns.
+        """
+        if not (rating_delta or count_delta):
+            return
+        rating_sum = F('rating_sum') + rating_delta
+        review_count = F('review_count') + count_delta
+        cls.objects.filter(pk=pet_id).update(
+            rating_sum=rating_sum,
+            review_count=review_count,
+            # Every SET expression sees the row as it was before the UPDATE
+            average_rating=Cast(rating_sum, FloatField()) / Greatest(
+                review_count, Value(1), output_field=PositiveBigIntegerField()
+            ),
+        )
+
+    @classmethod
+    def reconcile_ratings(cls, pet_ids=None, batch_size=500):
+        """
+        Recompute the rating of every pet, or of those in pet_ids, from one
+        grouped aggregate over the approved reviews and write the ones that
+        drifted; return their number.
+        """
+        reviews = PetReview.objects.filter(approved=True)
+        pets = cls.objects.all()
+        if pet_ids is not None:
+            reviews = reviews.filter(pet_id__in=pet_ids)
+            pets = pets.filter(pk__in=pet_ids)
+        totals = {
+            pet_id: (total, count)
+            for pet_id, total, count in reviews.order_by()
+            .values('pet_id').annotate(total=Sum('rating'), count=Count('id'))
+            .values_list('pet_id', 'total', 'count')
+        }
+        stale = []
+        stored = pets.order_by().values_list('pk', *RATING_FIELDS)
+        for pk, rating_sum, review_count, average_rating in stored.iterator(chunk_size=batch_size):
+            total, count = totals.get(pk, (0, 0))
+            expected = (total, count, _average(total, count))
+            if (rating_sum, review_count, average_rating) != expected:
+                stale.append(cls(pk=pk, **dict(zip(RATING_FIELDS, expected))))
+        cls.objects.bulk_update(stale, RATING_FIELDS, batch_size=batch_size)
+        return len(stale)
+
+
+# Columns written by rating maintenance, in this order
+RATING_FIELDS = ('rating_sum', 'review_count', 'average_rating')
+
+
+def _average(rating_sum, review_count):
+    return rating_sum / review_count if review_count else 0.0
+
+
+# Name fragments that identify each kind of product category. A name can
+# match several kinds ("Toys & Accessories"); the first listed is stored
+# as its kind, and kind_filter() still lists it under the others.
+CATEGORY_KIND_KEYWORDS = [
+    ('accessories', ['accessor']),
+    ('medicine', ['medicine']),
+    ('food', ['food']),
+    ('cage', ['cage']),
+    ('aquarium', ['aquarium', 'tank']),
+    ('toys', ['toy']),
+]
+
+
+def category_kind(name):
+    """Guess the kind of a product category from its name."""
+    lowered = (name or '').lower()
+    for kind, fragments in CATEGORY_KIND_KEYWORDS:
+        if any(fragment in lowered for fragment in fragments):
+            return kind
+    return 'other'
+
+
+def kind_filter(*kinds, prefix=''):
+    """
+    Q matching the product categories of any of kinds the way a name search
+    would. Only the first kind a name matches is stored, so categories of
+    an earlier kind whose name also names one of kinds match too ("Aquarium
+    Accessories" is stored as accessories and listed with aquariums).
+    prefix reaches the category through a relation, e.g. 'category__'.
+    """
+    order = [kind for kind, _ in CATEGORY_KIND_KEYWORDS]
+    fragments = dict(CATEGORY_KIND_KEYWORDS)
+    matches = Q(**{f'{prefix}kind__in': kinds})
+    for kind in kinds:
+        if kind not in fragments or order.index(kind) == 0:
+            continue
+        named = Q()
+        for fragment in fragments[kind]:
+            named |= Q(**{f'{prefix}name__icontains': fragment})
+        matches |= Q(**{f'{prefix}kind__in': order[:order.index(kind)]}) & named
+    return matches
 
 
 class ProductCategory(models.Model):
+
+    class Kind(models.TextChoices):
+        ACCESSORIES = 'accessories', 'Accessories'
+        TOYS = 'toys', 'Toys'
+        MEDICINE = 'medicine', 'Medicine'
+        FOOD = 'food', 'Food'
+        CAGE = 'cage', 'Cage'
+        AQUARIUM = 'aquarium', 'Aquarium / Tank'
+        OTHER = 'other', 'Other'
+
     name = models.CharField(max_length=50)
     pet_category = models.ForeignKey(PetCategory, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=Kind.choices, blank=True,
+                            help_text="Taxonomy used by the listing pages; guessed from the name when left blank")
     slug = models.SlugField(max_length=100, unique=True, blank=True, null=True)
     image = models.ImageField(upload_to='category_images/', blank=True, null=True)
 
     class Meta:
         verbose_name_plural = "Product Categories"
         db_table = "product_category"
+        indexes = [
+            models.Index(fields=['kind', 'pet_category'], name='product_category_kind_pet_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.pet_category.name})"
 
     def save(self, *args, **kwargs):
+        if not self.kind:
+            self.kind = category_kind(self.name)
         if not self.slug:
             base_slug = slugify(f"{self.name} {self.pet_category.name}")
             slug_candidate = base_slug
@@ -94,6 +220,80 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 
+
+class CategoryFacet(models.Model):
+    """
+    Precomputed number of products in each product category, read by the
+    listing sidebars instead of counting products on every request. Kept
+    up to date by shop/signals.py; `manage.py rebuild_category_facets`
+    recounts everything (e.g. after bulk imports, which skip signals).
+    """
+    # No database constraint, so a facet can be refreshed while its
+    # category is being deleted; the row is removed right after.
+    category = models.OneToOneField(ProductCategory, on_delete=models.DO_NOTHING, db_constraint=False,
+                                    primary_key=True, related_name='facet')
+    product_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "product_category_facet"
+
+    def __str__(self):
+        return f"{self.category_id}: {self.product_count} products"
+
+    @classmethod
+    def refresh(cls, category_ids):
+        """Recount the products of the given categories."""
+        category_ids = set(category_ids) - {None}
+        if not category_ids:
+            return
+        counts = dict(
+            Product.objects.filter(category_id__in=category_ids)
+            .values('category_id').annotate(n=Count('id')).values_list('category_id', 'n')
+        )
+        for category_id in category_ids:
+            cls.objects.update_or_create(
+                category_id=category_id,
+                defaults={'product_count': counts.get(category_id, 0)},
+            )
+
+    @classmethod
+    def rebuild(cls):
+        """Recount every category; return the number of facets written."""
+        counts = dict(
+            Product.objects.values('category_id').annotate(n=Count('id')).values_list('category_id', 'n')
+        )
+        facets = [
+            cls(category_id=pk, product_count=counts.get(pk, 0))
+            for pk in ProductCategory.objects.values_list('pk', flat=True)
+        ]
+        cls.objects.all().delete()
+        cls.objects.bulk_create(facets)
+        return len(facets)
+
+
+class PetReviewQuerySet(models.QuerySet):
+
+    def approve(self):
+        """Approve the pending reviews in this queryset and recompute their pets' ratings; return how many."""
+        with transaction.atomic():
+            pending = self.filter(approved=False)
+            pet_ids = set(pending.order_by().values_list('pet_id', flat=True).distinct())
+            approved = pending.update(approved=True)
+            Pet.reconcile_ratings(pet_ids)
+        return approved
+
+    def reject(self):
+        """Delete the reviews in this queryset and recompute their pets' ratings; return how many."""
+        with transaction.atomic():
+            reviews = self.model.objects.filter(pk__in=list(self.values_list('pk', flat=True)))
+            pet_ids = set(reviews.filter(approved=True).order_by().values_list('pet_id', flat=True).distinct())
+            # Unpublished first, so the delete signals have no ratings to adjust one by one
+            reviews.update(approved=False)
+            rejected = reviews.delete()[1].get(self.model._meta.label, 0)
+            Pet.reconcile_ratings(pet_ids)
+        return rejected
+
+
 class PetReview(models.Model):
     pet = models.ForeignKey(Pet, related_name='reviews', on_delete=models.CASCADE)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -102,6 +302,16 @@ class PetReview(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     approved = models.BooleanField(default=False)  # For moderation
 
+    objects = PetReviewQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Moderation queue: pending (or published) reviews by age
+            models.Index(fields=['approved', 'created_at'], name='shop_review_approved_idx'),
+            # A pet's published reviews, newest first, paged by (created_at, id)
+            models.Index(fields=['pet', 'approved', '-created_at', '-id'], name='shop_review_pet_page_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user} - {self.pet} ({self.rating} stars)"
     
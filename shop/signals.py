@@ -0,0 +1,77 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Pet, PetReview, Product, ProductCategory, CategoryFacet
+
+
+# --------------------------
+# Keep the per-category product counts (facets) up to date
+# --------------------------
+@receiver(pre_save, sender=Product)
+def remember_product_category(sender, instance, **kwargs):
+    # Category the product is moved out of, if any
+    instance._previous_category_id = None
+    if instance.pk:
+        instance._previous_category_id = (
+            Product.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Product)
+def count_saved_product(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_category_id', None)
+    if kwargs.get('created') or previous != instance.category_id:
+        CategoryFacet.refresh([instance.category_id, previous])
+
+
+@receiver(post_delete, sender=Product)
+def count_deleted_product(sender, instance, **kwargs):
+    CategoryFacet.refresh([instance.category_id])
+
+
+@receiver(post_save, sender=ProductCategory)
+def create_category_facet(sender, instance, created, **kwargs):
+    if created:
+        CategoryFacet.refresh([instance.pk])
+
+
+@receiver(post_delete, sender=ProductCategory)
+def delete_category_facet(sender, instance, **kwargs):
+    CategoryFacet.objects.filter(category_id=instance.pk).delete()
+
+
+# --------------------------
+# Keep the pets' ratings up to date as reviews are approved, edited or deleted
+# --------------------------
+def _counted(review):
+    """(pet_id, rating) an approved review adds to its pet's rating, else None."""
+    return (review.pet_id, review.rating) if review.approved else None
+
+
+@receiver(pre_save, sender=PetReview)
+def remember_review_rating(sender, instance, **kwargs):
+    # What the review counted for before this save, if anything
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = (
+            PetReview.objects.filter(pk=instance.pk, approved=True).values_list('pet_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=PetReview)
+def rate_saved_review(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    current = _counted(instance)
+    if previous == current:
+        return
+    if previous:
+        Pet.adjust_rating(previous[0], -previous[1], -1)
+    if current:
+        Pet.adjust_rating(current[0], current[1], 1)
+
+
+@receiver(post_delete, sender=PetReview)
+def unrate_deleted_review(sender, instance, **kwargs):
+    counted = _counted(instance)
+    if counted:
+        Pet.adjust_rating(counted[0], -counted[1], -1)
@@ -12,3 +12,9 @@ def to_range(start, end):
         return range(start, end + 1)
     except ValueError:
         return []
+
+
+@register.filter
+def wishlisted(item, shopper):
+    """Whether item is in the shopper's wishlist: {% if pet|wishlisted:shopper %}."""
+    return shopper.has_wishlisted(item)
@@ -1,3 +1,309 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from carts.models import Cart, CartItem
+from core.testing import create_shopper, create_store
+from wishlist.models import WishlistItem
+from .item_page import RELATED_PRODUCTS_LIMIT, REVIEWS_LIMIT
+from .models import CategoryFacet, Pet, PetCategory, PetReview, Product, ProductCategory, category_kind
+from .views import LISTING_PAGE_SIZE
+
+
+class PetDetailTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        store = create_store()
+        dogs = PetCategory.objects.create(name='Dogs')
+        food = ProductCategory.objects.create(name='Food', pet_category=dogs)
+        cls.pet = Pet.objects.create(
+            name='Bruno', category=dogs, breed='Beagle', age=2, price=100,
+            image='pets/bruno.jpg', store=store,
+        )
+        cls.user = create_shopper()
+
+        # More related products and reviews than the page shows
+        Product.objects.bulk_create(
+            Product(name=f'Kibble {i}', category=food, price=10, image='products/kibble.jpg', store=store)
+            for i in range(RELATED_PRODUCTS_LIMIT + 5)
+        )
+        reviewers = User.objects.bulk_create(
+            User(username=f'reviewer{i}', email=f'reviewer{i}@example.com', phone_number=f'{i}')
+            for i in range(REVIEWS_LIMIT + 5)
+        )
+        PetReview.objects.bulk_create(
+            PetReview(pet=cls.pet, user=reviewer, rating=5, comment='Lovely', approved=True)
+            for reviewer in reviewers
+        )
+
+    def setUp(self):
+        # Content types are cached per process; load them before counting
+        ContentType.objects.get_for_model(Pet)
+        cache.clear()  # and start with no navbar counts cached
+
+    def get_page(self):
+        return self.client.get(reverse('shop:pet_detail', args=[self.pet.pk]))
+
+    def test_related_products_and_reviews_are_bounded(self):
+        response = self.get_page()
+        self.assertEqual(len(response.context['related_products']), RELATED_PRODUCTS_LIMIT)
+        self.assertEqual(len(response.context['reviews']), REVIEWS_LIMIT)
+
+    def test_more_reviews_are_loaded_by_cursor(self):
+        first_page = self.get_page().context['reviews']
+        self.assertTrue(first_page.has_next())
+
+        # One query per page of reviews, authors included
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse('shop:pet_reviews', args=[self.pet.pk]), {'cursor': first_page.next_cursor}
+            )
+        data = response.json()
+        self.assertEqual(data['html'].count('class="media mb-4"'), 5)
+        self.assertIsNone(data['next_cursor'])
+        shown = {review.user.username for review in first_page}
+        self.assertFalse(any(f'by {username} ' in data['html'] for username in shown))
+
+    def test_load_more_rejects_invalid_cursors(self):
+        url = reverse('shop:pet_reviews', args=[self.pet.pk])
+        for params in [{}, {'cursor': 'garbage'}]:
+            self.assertEqual(self.client.get(url, params).status_code, 400)
+
+    # Three queries are the page itself: the pet with its category, store and
+    # shopper flags, the related products and the reviews. Signed in, the
+    # session and the user (which carries the navbar counts) are read too.
+    def test_anonymous_query_budget(self):
+        with self.assertNumQueries(3):
+            self.get_page()
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+
+    def test_signed_in_query_budget(self):
+        content_type = ContentType.objects.get_for_model(Pet)
+        WishlistItem.objects.create(user=self.user, content_type=content_type, object_id=self.pet.pk)
+        cart = Cart.objects.create(cart_id='shopper-cart', user=self.user)
+        CartItem.objects.create(user=self.user, cart=cart, content_type=content_type, object_id=self.pet.pk)
+        self.client.force_login(self.user)
+
+        # The navbar counts come with the user
+        with self.assertNumQueries(5):
+            response = self.get_page()
+        self.assertTrue(response.context['is_in_wishlist'])
+        self.assertTrue(response.context['in_cart'])
+
+
+class PetRatingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        store = create_store()
+        dogs = PetCategory.objects.create(name='Dogs')
+        cls.pet = Pet.objects.create(
+            name='Bruno', category=dogs, age=2, price=100, image='pets/bruno.jpg', store=store,
+        )
+        cls.reviewers = User.objects.bulk_create(
+            User(username=f'reviewer{i}', email=f'reviewer{i}@example.com', phone_number=f'{i}')
+            for i in range(3)
+        )
+
+    def review(self, reviewer, rating, approved=False):
+        return PetReview.objects.create(pet=self.pet, user=reviewer, rating=rating, comment='Ok', approved=approved)
+
+    def assertRating(self, rating_sum, review_count, average_rating):
+        self.pet.refresh_from_db()
+        self.assertEqual(
+            (self.pet.rating_sum, self.pet.review_count, self.pet.average_rating),
+            (rating_sum, review_count, average_rating),
+        )
+
+    def test_only_approved_reviews_count(self):
+        first = self.review(self.reviewers[0], 5, approved=True)
+        second = self.review(self.reviewers[1], 2)
+        self.assertRating(5, 1, 5.0)
+
+        second.approved = True
+        second.save()
+        self.assertRating(7, 2, 3.5)
+
+        first.rating = 3
+        first.save()
+        self.assertRating(5, 2, 2.5)
+
+        first.approved = False
+        first.save()
+        self.assertRating(2, 1, 2.0)
+
+        second.delete()
+        self.assertRating(0, 0, 0.0)
+
+    def test_approving_updates_only_the_rating_columns(self):
+        review = self.review(self.reviewers[0], 4)
+        review.approved = True
+        with self.assertNumQueries(3) as queries:
+            review.save()
+        update = queries.captured_queries[-1]['sql']
+        self.assertIn('"rating_sum" = ', update)
+        self.assertNotIn('"description"', update)
+
+    def test_reconcile_ratings_fixes_drift(self):
+        self.review(self.reviewers[0], 4, approved=True)
+        self.review(self.reviewers[1], 1, approved=True)
+        PetReview.objects.bulk_create([
+            PetReview(pet=self.pet, user=self.reviewers[2], rating=4, comment='Ok', approved=True),
+        ])  # skips the signals
+        self.assertRating(5, 2, 2.5)
+
+        # The grouped totals, the stored ratings and one write for the drifted pet
+        with self.assertNumQueries(3):
+            self.assertEqual(Pet.reconcile_ratings(), 1)
+        self.assertRating(9, 3, 3.0)
+        self.assertEqual(Pet.reconcile_ratings(), 0)
+
+    def test_bulk_moderation_recomputes_ratings_once(self):
+        PetReview.objects.bulk_create(
+            PetReview(pet=self.pet, user=reviewer, rating=rating, comment='Ok')
+            for reviewer, rating in zip(self.reviewers, (5, 4, 3))
+        )
+        # The pets of the pending reviews, one UPDATE approving them, then the
+        # grouped totals, the stored ratings and their write (and a savepoint
+        # pair), whatever the size of the batch
+        with self.assertNumQueries(7):
+            self.assertEqual(PetReview.objects.approve(), 3)
+        self.assertRating(12, 3, 4.0)
+        self.assertEqual(PetReview.objects.approve(), 0)
+
+        self.assertEqual(PetReview.objects.filter(rating__lt=5).reject(), 2)
+        self.assertRating(5, 1, 5.0)
+        self.assertEqual(PetReview.objects.count(), 1)
+
+
+class CategoryKindTests(TestCase):
+
+    def test_kind_is_guessed_from_the_name(self):
+        self.assertEqual(category_kind('Dog Food'), 'food')
+        self.assertEqual(category_kind('Fish Tanks'), 'aquarium')
+        self.assertEqual(category_kind('Chew Toys'), 'toys')
+        self.assertEqual(category_kind('Grooming'), 'other')
+        # Accessories take precedence, as on the accessories listing
+        self.assertEqual(category_kind('Toys & Accessories'), 'accessories')
+
+    def test_mixed_category_is_listed_with_accessories(self):
+        dogs = PetCategory.objects.create(name='Dogs')
+        mixed = ProductCategory.objects.create(name='Toys & Accessories', pet_category=dogs)
+        chew = ProductCategory.objects.create(name='Chew Toys', pet_category=dogs, kind='other')
+        self.assertEqual(mixed.kind, ProductCategory.Kind.ACCESSORIES)
+        self.assertEqual(chew.kind, ProductCategory.Kind.OTHER)  # set by hand
+
+        response = self.client.get(reverse('shop:accessories_all_pets'))
+        self.assertEqual(list(response.context['accessories_categories']), [mixed])
+
+    def test_mixed_categories_keep_every_listing_they_name(self):
+        store = create_store()
+        fish = PetCategory.objects.create(name='Fish')
+        birds = PetCategory.objects.create(name='Birds')
+        aquarium = ProductCategory.objects.create(name='Aquarium Accessories', pet_category=fish)
+        cage = ProductCategory.objects.create(name='Bird Cage Accessories', pet_category=birds)
+        self.assertEqual(aquarium.kind, ProductCategory.Kind.ACCESSORIES)
+        filter_ = Product.objects.create(name='Filter', category=aquarium, price=10, image='products/f.jpg', store=store)
+        perch = Product.objects.create(name='Perch', category=cage, price=10, image='products/p.jpg', store=store)
+
+        def listed(url):
+            return list(self.client.get(url).context['products'])
+
+        self.assertEqual(listed(reverse('shop:fish_aquarium_supplies')), [filter_])
+        self.assertEqual(listed(reverse('shop:bird_cages')), [perch])
+        self.assertEqual(listed(reverse('shop:all_products') + '?category=aquarium_supplies'), [filter_])
+        self.assertEqual(listed(reverse('shop:all_products') + '?category=cages'), [perch])
+        self.assertEqual(listed(reverse('shop:accessories_all_pets')), [perch, filter_])
+
+
+class CategoryKindMigrationTests(TransactionTestCase):
+
+    before = [('shop', '0009_order_payment_status_order_user')]
+    after = [('shop', '0010_productcategory_kind')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_existing_categories_are_classified(self):
+        apps = self.migrate(self.before)
+        pet_category = apps.get_model('shop', 'PetCategory').objects.create(name='Dogs')
+        ProductCategory = apps.get_model('shop', 'ProductCategory')
+        for i, name in enumerate(['Toys & Accessories', 'Chew Toys', 'Dog Food', 'Leashes']):
+            ProductCategory.objects.create(name=name, pet_category=pet_category, slug=f'category-{i}')
+
+        apps = self.migrate(self.after)
+        kinds = dict(apps.get_model('shop', 'ProductCategory').objects.values_list('name', 'kind'))
+        self.assertEqual(kinds, {
+            'Toys & Accessories': 'accessories',
+            'Chew Toys': 'toys',
+            'Dog Food': 'food',
+            'Leashes': 'other',
+        })
+
+
+class CategoryFacetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.store = create_store()
+        dogs = PetCategory.objects.create(name='Dogs')
+        cls.dry = ProductCategory.objects.create(name='Dry Food', pet_category=dogs)
+        cls.wet = ProductCategory.objects.create(name='Wet Food', pet_category=dogs)
+
+    def product(self, category):
+        return Product.objects.create(name='Kibble', category=category, price=10, image='products/k.jpg', store=self.store)
+
+    def counts(self):
+        return dict(CategoryFacet.objects.values_list('category__name', 'product_count'))
+
+    def test_counts_follow_creates_moves_and_deletes(self):
+        self.assertEqual(self.counts(), {'Dry Food': 0, 'Wet Food': 0})
+        kibble = self.product(self.dry)
+        self.product(self.dry)
+        self.assertEqual(self.counts(), {'Dry Food': 2, 'Wet Food': 0})
+
+        kibble.category = self.wet
+        kibble.save()
+        self.assertEqual(self.counts(), {'Dry Food': 1, 'Wet Food': 1})
+
+        kibble.delete()
+        self.assertEqual(self.counts(), {'Dry Food': 1, 'Wet Food': 0})
+
+        self.wet.delete()
+        self.assertEqual(self.counts(), {'Dry Food': 1})
+
+    def test_rebuild_recounts_bulk_imports(self):
+        Product.objects.bulk_create(
+            Product(name='Kibble', category=self.wet, price=10, image='products/k.jpg', store=self.store)
+            for _ in range(3)
+        )  # skips the signals
+        self.assertEqual(self.counts()['Wet Food'], 0)
+        call_command('rebuild_category_facets', stdout=StringIO())
+        self.assertEqual(self.counts(), {'Dry Food': 0, 'Wet Food': 3})
+
+    def test_listing_pages_and_sidebar_counts(self):
+        for _ in range(LISTING_PAGE_SIZE + 1):
+            self.product(self.dry)
+        response = self.client.get(reverse('shop:food_all_pets'))
+        self.assertEqual(len(response.context['products']), LISTING_PAGE_SIZE)
+        self.assertTrue(response.context['products'].has_next())
+        # Only categories with products, counted from the facets
+        sidebar = [(category.name, category.product_count) for category in response.context['food_categories']]
+        self.assertEqual(sidebar, [('Dry Food', LISTING_PAGE_SIZE + 1)])
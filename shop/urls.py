@@ -6,6 +6,8 @@ app_name = 'shop'
 urlpatterns = [
     path('store/', views.pet_store_home, name='store'),
     path('store/pet/<int:pk>/', views.pet_detail, name='pet_detail'),
+    # Further pages of a pet's reviews, as HTML inside JSON
+    path('store/pet/<int:pk>/reviews/', views.pet_reviews, name='pet_reviews'),
     # Toggle favourite for a pet (requires login)
     path('store/pet/<int:pet_id>/toggle-favourite/', views.toggle_favourite, name='toggle_favourite'),
     # Submit a review for a pet (requires login)
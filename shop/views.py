@@ -1,17 +1,18 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from django.core.paginator import Paginator
-from django.contrib.contenttypes.models import ContentType
+from django.template.loader import render_to_string
 
-from .models import Pet, PetCategory, ProductCategory, Product, Store, Favourite, PetReview,Order
-from wishlist.models import WishlistItem  # adjust import path if different
+from .models import Pet, PetCategory, ProductCategory, Product, Store, Favourite, PetReview,Order, kind_filter
 from django.contrib import messages
 from django.views.decorators.http import require_POST
-# from carts.utils import _cart_id
+from carts.utils import guest_cart
+from .cartables import get_cartable
 from carts.models import Cart, CartItem
-from django.db.models import Count, Q
+from django.db.models import F
 from urllib.parse import urlencode
+from core.pagination import InvalidCursor, paginate_by_cursor
+from .item_page import pet_page_context, product_page_context, review_page
 
 
 def pet_store_home(request):
@@ -20,14 +21,12 @@ def pet_store_home(request):
     """
     categories = PetCategory.objects.all()
     selected_category = request.GET.get('category')
-    pets = Pet.objects.all()
+    pets = Pet.objects.select_related('category')
 
     if selected_category:
         pets = pets.filter(category_id=selected_category)
 
-    paginator = Paginator(pets, 6)  # 4 pets per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate_by_cursor(request, pets, ['id'], 6, with_count=True)  # 6 pets per page
 
     context = {
         'categories': categories,
@@ -41,58 +40,7 @@ def pet_detail(request, pk):
     """
     Detail view of a pet including related products, reviews, wishlist and in-cart status.
     """
-    pet = get_object_or_404(Pet, pk=pk)
-
-    # Fetch all product categories for this pet's category
-    product_categories = ProductCategory.objects.filter(pet_category=pet.category)
-
-    accessory_pet = product_categories.filter(name__istartswith='Accessories')
-    accessories = Product.objects.filter(category__in=accessory_pet).distinct()[:6]
-    related_products = Product.objects.filter(category__pet_category=pet.category)
-    print("Related Products total count:", related_products.count())
-
-    # Prepare reviews (approved and ordered)
-    reviews = pet.reviews.filter(approved=True).order_by('-created_at')
-
-    # Wishlist status for current user (generic wishlist)
-    is_in_wishlist = False
-    if request.user.is_authenticated:
-        content_type = ContentType.objects.get_for_model(pet)
-        is_in_wishlist = WishlistItem.objects.filter(
-            user=request.user,
-            content_type=content_type,
-            object_id=pet.id
-        ).exists()
-
-    # Get or find cart (user or session)
-    cart = None
-    if request.user.is_authenticated:
-        cart = Cart.objects.filter(user=request.user).first()
-    if not cart:
-        cart = Cart.objects.filter(cart_id=_cart_id(request)).first()
-
-    in_cart = False
-    if cart:
-        content_type = ContentType.objects.get_for_model(pet)
-        in_cart = CartItem.objects.filter(
-            cart=cart,
-            content_type=content_type,
-            object_id=pet.id,
-            active=True
-        ).exists()
-
-    context = {
-        'pet': pet,
-        'accessories': accessories,
-        'related_products': related_products,
-        'reviews': reviews,
-        'average_rating': pet.average_rating,
-        'review_count': pet.review_count,
-        'is_in_wishlist': is_in_wishlist,
-        'in_cart': in_cart,
-    }
-    return render(request, 'shop/pet_detail.html', context)
-
+    return render(request, 'shop/pet_detail.html', pet_page_context(request, pk))
 
 
 @login_required
@@ -113,6 +61,26 @@ def toggle_favourite(request, pet_id):
     return redirect('shop:pet_detail', pk=pet_id)
 
 
+def pet_reviews(request, pk):
+    """
+    JSON "load more" endpoint: the page of a pet's approved reviews after
+    the cursor parameter, rendered as HTML, and the cursor of the next one.
+    A missing or invalid cursor is a 400, since falling back to the first
+    page would repeat reviews already on the page.
+    """
+    cursor = request.GET.get('cursor')
+    try:
+        if not cursor:
+            raise InvalidCursor(cursor)
+        page = review_page(pk, cursor, strict=True)
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+    return JsonResponse({
+        'html': render_to_string('shop/_reviews.html', {'reviews': page}, request=request),
+        'next_cursor': page.next_cursor,
+    })
+
+
 @login_required
 def add_pet_review(request, pet_id):
     """
@@ -135,11 +103,8 @@ def add_pet_review(request, pet_id):
             )
             return redirect('shop:pet_detail', pk=pet.pk)
         else:
-            context = {
-                'pet': pet,
-                'error': 'Please fill in all fields.',
-                'reviews': pet.reviews.filter(approved=True).order_by('-created_at'),
-            }
+            context = pet_page_context(request, pet.pk)
+            context['error'] = 'Please fill in all fields.'
             return render(request, 'shop/pet_detail.html', context)
     else:
         return redirect('shop:pet_detail', pk=pet.pk)
@@ -150,8 +115,13 @@ def store_detail(request, pk):
     View to see store details including pets and products.
     """
     store = get_object_or_404(Store, pk=pk)
-    pets = store.pets.all()
-    products = store.products.all()
+    # Each section pages independently with its own cursor parameter
+    pets = paginate_by_cursor(
+        request, store.pets.select_related('category'), ['-id'], 6, param='pets_cursor'
+    )
+    products = paginate_by_cursor(
+        request, store.products.select_related('category'), ['-id'], 8, param='products_cursor'
+    )
 
     context = {
         'store': store,
@@ -160,13 +130,6 @@ def store_detail(request, pk):
     }
     return render(request, 'shop/store_detail.html', context)
 
-def _cart_id(request):
-    cart_id = request.session.session_key
-    if not cart_id:
-        request.session.create()
-        cart_id = request.session.session_key
-    return cart_id
-
 def checkout(request):
     item = None
     is_single_item = False
@@ -177,16 +140,14 @@ def checkout(request):
     item_id = request.GET.get('item_id')
     model_name = request.GET.get('model')
 
-    CARTABLE_MODELS = {'pet': Pet, 'product': Product}
-
     if model_name and item_id:
         # Buy now single item
-        model = CARTABLE_MODELS.get(model_name)
-        if model:
-            item = get_object_or_404(model, pk=item_id)
+        cartable = get_cartable(model_name)
+        if cartable:
+            item = get_object_or_404(cartable.model, pk=item_id)
             is_single_item = True
             item_model = model_name
-            total = item.price
+            total = cartable.price(item)
             quantity = 1
         else:
             messages.error(request, "Invalid item specified.")
@@ -196,21 +157,20 @@ def checkout(request):
         if request.user.is_authenticated:
             cart = Cart.objects.filter(user=request.user).first()
         else:
-            cart = Cart.objects.filter(cart_id=_cart_id(request)).first()
+            cart = guest_cart(request)
 
         if not cart:
             messages.error(request, "You have no active cart.")
             return redirect('shop:store')
 
-        cart_items = CartItem.objects.filter(cart=cart, active=True)
+        cart_items, quantity, total = (
+            CartItem.objects.filter(cart=cart, active=True).with_objects().summary()
+        )
 
-        if not cart_items.exists():
+        if not cart_items:
             messages.error(request, "Your cart is empty.")
             return redirect('shop:store')
 
-        total = sum(ci.subtotal() for ci in cart_items)
-        quantity = sum(ci.quantity for ci in cart_items)
-
     context = {
         'is_single_item': is_single_item,
         'item': item,
@@ -339,26 +299,23 @@ def process_order(request):
         messages.error(request, "Please fill all required fields.")
         return redirect('shop:checkout')
 
-    CARTABLE_MODELS = {'pet': Pet, 'product': Product}
-
     # Handle single item order (buy now)
     if is_single_item:
-        model = request.POST.get('item_model')
         item_id = request.POST.get('item_id')
-        model_cls = CARTABLE_MODELS.get(model)
+        cartable = get_cartable(request.POST.get('item_model'))
 
-        if not model_cls:
+        if not cartable:
             messages.error(request, "Invalid item specified.")
             return redirect('shop:checkout')
 
         try:
-            item = model_cls.objects.get(pk=item_id)
-        except model_cls.DoesNotExist:
+            item = cartable.model.objects.get(pk=item_id)
+        except (cartable.model.DoesNotExist, ValueError):
             messages.error(request, "Item not found.")
             return redirect('shop:checkout')
 
         order = Order.objects.create(
-            item_name=item.name,
+            item_name=cartable.label(item),
             buyer_name=buyer_name,
             email=email,
             phone=phone,
@@ -366,26 +323,26 @@ def process_order(request):
             payment_method=payment_method,
             user_upi_id=user_upi_id if payment_method == 'upi' else None,
         )
-        order_amount = float(item.price)  # Assume price field exists
+        order_amount = cartable.price(item)
 
     # Handle cart order
     else:
         if request.user.is_authenticated:
             cart = Cart.objects.filter(user=request.user).first()
         else:
-            cart = Cart.objects.filter(cart_id=_cart_id(request)).first()
+            cart = guest_cart(request)
 
         if not cart:
             messages.error(request, "You have no active cart.")
             return redirect('shop:checkout')
 
-        cart_items = CartItem.objects.filter(cart=cart, active=True)
-        if not cart_items.exists():
+        cart_items, _, order_amount = CartItem.objects.filter(cart=cart, active=True).summary()
+        if not cart_items:
             messages.error(request, "Your cart is empty.")
             return redirect('shop:checkout')
 
         order = Order.objects.create(
-            item_name=f"Cart order with {cart_items.count()} items",
+            item_name=f"Cart order with {len(cart_items)} items",
             buyer_name=buyer_name,
             email=email,
             phone=phone,
@@ -393,7 +350,6 @@ def process_order(request):
             payment_method=payment_method,
             user_upi_id=user_upi_id if payment_method == 'upi' else None,
         )
-        order_amount = sum(ci.subtotal() for ci in cart_items)
 
         # Mark cart items inactive after order placed
         # cart_items.update(active=False)
@@ -435,10 +391,8 @@ def order_success(request):
 
 def product_list_by_category(request, category_slug):
     category = get_object_or_404(ProductCategory, slug=category_slug)
-    products_qs = Product.objects.filter(category=category).distinct()
-    paginator = Paginator(products_qs, 4)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    products_qs = Product.objects.filter(category=category)
+    page_obj = paginate_by_cursor(request, products_qs, ['-id'], 4)
 
     context = {
         'category': category,
@@ -450,45 +404,7 @@ def product_list_by_category(request, category_slug):
 
 
 def product_detail(request, pk):
-    product = get_object_or_404(Product, pk=pk)
-
-    # -------------------
-    # Check cart (auth / guest)
-    # -------------------
-    if request.user.is_authenticated:
-        cart = Cart.objects.filter(user=request.user).first()
-    else:
-        cart = Cart.objects.filter(cart_id=_cart_id(request)).first()
-
-    in_cart = False
-    if cart:
-        in_cart = CartItem.objects.filter(
-            cart=cart,
-            active=True,
-            content_type=ContentType.objects.get_for_model(Product),
-            object_id=product.id
-        ).exists()
-
-    # -------------------
-    # Check wishlist (auth only)
-    # -------------------
-    is_in_wishlist = False
-    if request.user.is_authenticated:
-        is_in_wishlist = WishlistItem.objects.filter(
-            user=request.user,
-            content_type=ContentType.objects.get_for_model(Product),
-            object_id=product.id
-        ).exists()
-
-    # -------------------
-    # Context
-    # -------------------
-    context = {
-        'product': product,
-        'in_cart': in_cart,                  # For Add to Cart button state
-        'is_in_wishlist': is_in_wishlist     # For Wishlist heart state
-    }
-    return render(request, 'shop/product_detail.html', context)
+    return render(request, 'shop/product_detail.html', product_page_context(request, pk))
 
 
 def product_category_list(request):
@@ -496,10 +412,7 @@ def product_category_list(request):
     Show all product categories with pagination (4 per page).
     """
     categories_qs = ProductCategory.objects.select_related('pet_category').all()
-    paginator = Paginator(categories_qs, 4)  # Show 4 categories per page
-
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate_by_cursor(request, categories_qs, ['id'], 4)  # Show 4 categories per page
 
     context = {
         'categories': page_obj,  # use paginated object
@@ -507,12 +420,28 @@ def product_category_list(request):
     }
     return render(request, 'shop/category_list.html', context)
 
+# Products per page of the listing pages below
+LISTING_PAGE_SIZE = 12
+
+
+def sidebar_categories(kind):
+    """Categories of kind with their precomputed product_count, for sidebars."""
+    return (
+        ProductCategory.objects
+        .filter(kind_filter(kind))
+        .select_related('pet_category')
+        .annotate(product_count=F('facet__product_count'))
+    )
+
+
 def accessories_all_pets(request):
     # All accessory categories
-    accessories_categories = ProductCategory.objects.filter(name__icontains='Accessories')
+    accessories_categories = sidebar_categories(ProductCategory.Kind.ACCESSORIES)
 
-    # Fetch all products belonging to these categories
-    products = Product.objects.filter(category__in=accessories_categories)
+    # Products belonging to these categories, one page at a time
+    products = paginate_by_cursor(
+        request, Product.objects.filter(kind_filter(ProductCategory.Kind.ACCESSORIES, prefix='category__')), ['-id'], LISTING_PAGE_SIZE
+    )
 
     context = {
         'accessories_categories': accessories_categories,  # for sidebar links
@@ -521,16 +450,16 @@ def accessories_all_pets(request):
     return render(request, 'shop/accessories_all_pets.html', context)
 
 def medicines_all_pets(request):
-    # Get all medicine categories for any pet (match singular/plural)
+    # Get all medicine categories for any pet
     medicines_categories = (
-        ProductCategory.objects
-        .filter(Q(name__icontains='Medicine') | Q(name__icontains='Medicines'))
-        .annotate(product_count=Count('product'))
-        .filter(product_count__gt=0)   # only categories with products
+        sidebar_categories(ProductCategory.Kind.MEDICINE)
+        .filter(facet__product_count__gt=0)   # only categories with products
     )
 
-    # All products in those categories
-    products = Product.objects.filter(category__in=medicines_categories)
+    # Products in those categories, one page at a time
+    products = paginate_by_cursor(
+        request, Product.objects.filter(kind_filter(ProductCategory.Kind.MEDICINE, prefix='category__')), ['-id'], LISTING_PAGE_SIZE
+    )
 
     return render(request, 'shop/medicines_all_pets.html', {
         'medicines_categories': medicines_categories,
@@ -540,48 +469,43 @@ def medicines_all_pets(request):
 def food_all_pets(request):
     # Get all food categories for any pet
     food_categories = (
-        ProductCategory.objects
-        .filter(Q(name__icontains='Food') | Q(name__icontains='Foods'))
-        .annotate(product_count=Count('product'))
-        .filter(product_count__gt=0)   # Only categories with products
+        sidebar_categories(ProductCategory.Kind.FOOD)
+        .filter(facet__product_count__gt=0)   # Only categories with products
     )
 
-    # All products in those categories
-    products = Product.objects.filter(category__in=food_categories)
+    # Products in those categories, one page at a time
+    products = paginate_by_cursor(
+        request, Product.objects.filter(kind_filter(ProductCategory.Kind.FOOD, prefix='category__')), ['-id'], LISTING_PAGE_SIZE
+    )
 
     return render(request, 'shop/food_all_pets.html', {
         'food_categories': food_categories,
         'products': products
     })
 
+# Product kinds shown for each filter of the all products page
+ALL_PRODUCTS_FILTERS = {
+    'accessories_toys': [ProductCategory.Kind.ACCESSORIES, ProductCategory.Kind.TOYS],
+    'medicines': [ProductCategory.Kind.MEDICINE],
+    'food': [ProductCategory.Kind.FOOD],
+    'cages': [ProductCategory.Kind.CAGE],
+    'aquarium_supplies': [ProductCategory.Kind.AQUARIUM],
+}
+
+
 def all_products(request):
     selected_category = request.GET.get('category', '')
 
-    # Base queryset - latest first
-    products_qs = Product.objects.all().order_by('-id')
+    # Base queryset
+    products_qs = Product.objects.all()
 
     # Category filters
-    if selected_category == 'accessories_toys':
-        products_qs = products_qs.filter(
-            Q(category__name__icontains='Accessories') |
-            Q(category__name__icontains='Toys')
-        )
-    elif selected_category == 'medicines':
-        products_qs = products_qs.filter(category__name__icontains='Medicine')
-    elif selected_category == 'food':
-        products_qs = products_qs.filter(category__name__icontains='Food')
-    elif selected_category == 'cages':
-        products_qs = products_qs.filter(category__name__icontains='Cage')
-    elif selected_category == 'aquarium_supplies':
-        products_qs = products_qs.filter(
-            Q(category__name__icontains='Aquarium') |
-            Q(category__name__icontains='Tank')
-        )
+    kinds = ALL_PRODUCTS_FILTERS.get(selected_category)
+    if kinds:
+        products_qs = products_qs.filter(kind_filter(*kinds, prefix='category__'))
 
-    # Pagination: 6 products per page
-    paginator = Paginator(products_qs, 6)
-    page_number = request.GET.get('page')
-    products_page = paginator.get_page(page_number)
+    # Pagination: 6 products per page, latest first
+    products_page = paginate_by_cursor(request, products_qs, ['-id'], 6, with_count=True)
 
     context = {
         'products': products_page,            # paginated list
@@ -593,10 +517,12 @@ def all_products(request):
 def bird_cages(request):
     # Find categories that are cages for birds
     cage_categories = ProductCategory.objects.filter(
-        pet_category__name__iexact='Birds',
-        name__icontains='Cage'
+        kind_filter(ProductCategory.Kind.CAGE),
+        pet_category__name__iexact='Birds'
+    )
+    products = paginate_by_cursor(
+        request, Product.objects.filter(category__in=cage_categories), ['-id'], LISTING_PAGE_SIZE
     )
-    products = Product.objects.filter(category__in=cage_categories)
 
     return render(request, 'shop/cages_birds.html', {
         'products': products,
@@ -606,10 +532,13 @@ def bird_cages(request):
 def fish_aquarium_supplies(request):
     # Find categories for Aquarium Supplies for Fish
     aquarium_categories = ProductCategory.objects.filter(
+        kind_filter(ProductCategory.Kind.AQUARIUM),
         pet_category__name__iexact='Fish'
-    ).filter(name__icontains='Aquarium')
-    
-    products = Product.objects.filter(category__in=aquarium_categories)
+    )
+
+    products = paginate_by_cursor(
+        request, Product.objects.filter(category__in=aquarium_categories), ['-id'], LISTING_PAGE_SIZE
+    )
 
     return render(request, 'shop/aquarium_supplies_fish.html', {
         'products': products,
@@ -617,11 +546,8 @@ def fish_aquarium_supplies(request):
     })
 
 def all_pet_shops(request):
-    stores_list = Store.objects.all().order_by('name')  # optionally order alphabetically
-    paginator = Paginator(stores_list, 6)  # 6 shops per page
-
-    page_number = request.GET.get('page')
-    stores = paginator.get_page(page_number)
+    # 6 shops per page, alphabetically
+    stores = paginate_by_cursor(request, Store.objects.all(), ['name', 'id'], 6)
 
     return render(request, 'shop/all_pet_shops.html', {
         'stores': stores
@@ -3,6 +3,16 @@ from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
+class WishlistItemQuerySet(models.QuerySet):
+
+    def with_objects(self):
+        """
+        Load the wished-for pets/products with one query per content type
+        and attach them as content_object.
+        """
+        return self.select_related('content_type').prefetch_related('content_object')
+
+
 class WishlistItem(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='wishlist_items', on_delete=models.CASCADE)
     
@@ -13,6 +23,8 @@ class WishlistItem(models.Model):
     
     added_at = models.DateTimeField(auto_now_add=True)
 
+    objects = WishlistItemQuerySet.as_manager()
+
     class Meta:
         unique_together = ('user', 'content_type', 'object_id')
         ordering = ['-added_at']
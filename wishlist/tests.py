@@ -1,3 +1,106 @@
-from django.test import TestCase
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from carts.counters import adjust_wishlist_count
+from core.testing import create_shopper, create_store
+from shop.models import Pet, PetCategory
+from .models import WishlistItem
+
+
+class WishlistTestCase(TestCase):
+    """A signed-in shopper and a pet to wish for."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_shopper()
+        cls.pet = Pet.objects.create(
+            name='Pup', category=PetCategory.objects.create(name='Dogs'), age=1, price=100,
+            image='pets/pup.jpg', store=create_store(),
+        )
+
+
+class ToggleWishlistTests(WishlistTestCase):
+
+    def toggle(self, model, object_id):
+        return self.client.post(reverse('wishlist:toggle_wishlist'), {'model': model, 'object_id': object_id})
+
+    def test_toggle_adds_then_removes(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.toggle('Pet', self.pet.pk).json(), {'success': True, 'added': True, 'count': 1})
+        self.assertEqual(self.toggle('pet', self.pet.pk).json(), {'success': True, 'added': False, 'count': 0})
+        self.assertFalse(WishlistItem.objects.exists())
+
+    def test_add_that_loses_a_race_keeps_one_item_and_count(self):
+        self.client.force_login(self.user)
+        raced = []
+
+        def concurrent_add(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if not raced and sql.startswith('DELETE') and WishlistItem._meta.db_table in sql:
+                # Another request adds the same item right after we found none to remove
+                raced.append(True)
+                WishlistItem.objects.bulk_create([
+                    WishlistItem(user=self.user, content_type=ContentType.objects.get_for_model(Pet),
+                                 object_id=self.pet.pk)
+                ])
+                adjust_wishlist_count(self.user.pk, 1)
+            return result
+
+        with connection.execute_wrapper(concurrent_add):
+            response = self.toggle('pet', self.pet.pk)
+        self.assertTrue(raced)
+        self.assertEqual(response.json(), {'success': True, 'added': True, 'count': 1})
+        self.assertEqual(WishlistItem.objects.count(), 1)
+
+    def test_only_registered_models_and_existing_items(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.toggle('account', self.user.pk).status_code, 400)
+        self.assertEqual(self.toggle('pet', 999999).status_code, 404)
+        self.assertEqual(self.toggle('pet', 'abc').status_code, 404)
+
+
+class WishlistMembershipTests(WishlistTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.pets = [cls.pet] + [
+            Pet.objects.create(name=f'Pup {i}', category=cls.pet.category, age=1, price=100,
+                               image='pets/pup.jpg', store=cls.pet.store)
+            for i in range(4)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def hearts(self):
+        with self.assertNumQueries(self.expected_queries):
+            response = self.client.get(reverse('shop:store'))
+        return response.content.decode().count('fas fa-heart text-danger')
+
+    def test_listing_marks_wishlisted_cards_at_constant_cost(self):
+        pet_type = ContentType.objects.get_for_model(Pet)
+        # pets, their count, session, user (with the navbar counts), categories and the wishlist set
+        self.expected_queries = 6
+        self.assertEqual(self.hearts(), 0)
+
+        for pet in self.pets[:3]:
+            WishlistItem.objects.create(user=self.user, content_type=pet_type, object_id=pet.pk)
+        cache.clear()
+        self.assertEqual(self.hearts(), 3)
+
+    @override_settings(SHOPPER_SUMMARY_TIMEOUT=300)
+    def test_cached_wishlist_is_retired_by_a_toggle(self):
+        self.expected_queries = 6
+        self.assertEqual(self.hearts(), 0)
+        # The wishlist set (and the pets' count) now come from the cache
+        self.expected_queries = 4
+        self.assertEqual(self.hearts(), 0)
+
+        self.client.post(reverse('wishlist:toggle_wishlist'), {'model': 'pet', 'object_id': self.pet.pk})
+        self.expected_queries = 5
+        self.assertEqual(self.hearts(), 1)
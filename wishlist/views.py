@@ -1,14 +1,18 @@
 from django.shortcuts import render
+from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.http import JsonResponse
-from django.contrib.contenttypes.models import ContentType
 
+from carts.counters import adjust_wishlist_count
+from core.shopper import shopper_changed, shopper_summary
+from shop.cartables import get_cartable
 from .models import WishlistItem
 
 
 @login_required
 def view_wishlist(request):
-    items = WishlistItem.objects.filter(user=request.user).select_related('content_type')
+    items = WishlistItem.objects.filter(user=request.user).with_objects()
     context = {'wishlist_items': items}
     return render(request, 'wishlist/wishlist.html', context)
 
@@ -22,33 +26,32 @@ def toggle_wishlist(request):
         if not model or not object_id:
             return JsonResponse({'success': False, 'error': 'Missing model or object ID.'}, status=400)
 
-        try:
-            content_type = ContentType.objects.get(model=model.lower())
-            model_class = content_type.model_class()
-            obj = model_class.objects.get(pk=object_id)
-        except ContentType.DoesNotExist:
+        cartable = get_cartable(model)
+        if cartable is None:
             return JsonResponse({'success': False, 'error': 'Invalid model type.'}, status=400)
-        except model_class.DoesNotExist:
+        try:
+            object_id = int(object_id)
+        except ValueError:
+            object_id = None
+        if object_id is None or not cartable.existing_ids([object_id]):
             return JsonResponse({'success': False, 'error': 'Item does not exist.'}, status=404)
 
         user = request.user
+        content_type = cartable.content_type
         wishlist_qs = WishlistItem.objects.filter(user=user, content_type=content_type, object_id=object_id)
 
-        if wishlist_qs.exists():
-            wishlist_qs.delete()
-            count = WishlistItem.objects.filter(user=user).count()
-            return JsonResponse({'success': True, 'added': False, 'count': count})
-        else:
-            WishlistItem.objects.create(user=user, content_type=content_type, object_id=object_id)
-            count = WishlistItem.objects.filter(user=user).count()
-            return JsonResponse({'success': True, 'added': True, 'count': count})
+        with transaction.atomic():
+            added = not wishlist_qs.delete()[0]
+            if not added:
+                adjust_wishlist_count(user.pk, -1)
+            elif WishlistItem.objects.get_or_create(user=user, content_type=content_type, object_id=object_id)[1]:
+                # A concurrent add of the same item may have won the insert
+                adjust_wishlist_count(user.pk, 1)
+        shopper_changed(request)
+        count = get_user_model().objects.values_list('wishlist_count', flat=True).get(pk=user.pk)
+        return JsonResponse({'success': True, 'added': added, 'count': count})
 
     return JsonResponse({'success': False, 'error': 'Invalid HTTP method.'}, status=405)
 
 def wishlist_count_api(request):
-    if request.user.is_authenticated:
-        count = WishlistItem.objects.filter(user=request.user).count()
-    else:
-        count = 0
-    return JsonResponse({"count": count})
-
+    return JsonResponse({"count": shopper_summary(request).wishlist_count})